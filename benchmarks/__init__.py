@@ -0,0 +1,7 @@
+"""
+Benchmarks of the pairing, standing and ranking hot paths.
+
+Run them with ``python -m benchmarks``, see ``python -m benchmarks --help``. They run in a fresh test database,
+against postgres if DATABASE_URL points to one and SQLite otherwise. ``python -m benchmarks.startup`` measures
+the boot time and memory of a worker.
+"""
@@ -0,0 +1,55 @@
+import argparse
+import os
+import sys
+
+import django
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__import__("benchmarks").__doc__)
+    parser.add_argument("--tiers", type=int, nargs="+", help="numbers of players to benchmark with")
+    parser.add_argument("--tournaments", type=int, default=6, help="finished tournaments in the generated history")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement, the median is reported")
+    parser.add_argument("--baseline", default=os.path.join(os.path.dirname(__file__), "baseline.json"))
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="how much slower than the baseline counts as a regression, 0.25 is 25%%")
+    parser.add_argument("--save", action="store_true", help="save the measurements as the new baseline")
+    arguments = parser.parse_args(argv)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from benchmarks import suite
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    measurements = []
+    try:
+        for tier in arguments.tiers or suite.TIERS:
+            call_command("flush", interactive=False, verbosity=0)  # each tier starts with empty tables
+
+            tier_measurements = suite.run_tier(tier, arguments.tournaments, arguments.seed, arguments.repeat)
+            for measurement in tier_measurements:
+                print(f"{measurement.key:<45} {measurement.seconds * 1000:>10.2f} ms {measurement.queries:>6} queries")
+            measurements += tier_measurements
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    regressions = suite.compare(measurements, suite.load_baseline(arguments.baseline), arguments.threshold)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}", file=sys.stderr)
+
+    if arguments.save:
+        suite.save_baseline(arguments.baseline, measurements)
+        print(f"Saved the baseline to {arguments.baseline}.")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import math
+import random
+import typing
+
+from django.conf import settings
+
+from mtg_pairings import models
+
+
+def generate_players(count: int, seed: int = 0) -> typing.Dict[models.Player, float]:
+    """Creates count players and returns them with a random skill, players with a higher skill win more often."""
+    rng = random.Random(seed)
+    names = [f"Player {index:04}" for index in range(count)]
+    models.Player.objects.bulk_create(models.Player(name=name) for name in names)
+    return {player: rng.gauss(0, 1) for player in models.Player.objects.filter(name__in=names)}
+
+
+def play_round(tournament_round: models.Round, skills: typing.Dict[models.Player, float], rng: random.Random):
+    """Submits plausible results for all duels of the round, like the round form does."""
+    skills = {player.pk: skill for player, skill in skills.items()}
+    results = {}
+    for duel in tournament_round.duels.all():
+        if duel.is_bye:
+            continue
+
+        # best of three games, sometimes time runs out before someone won enough games.
+        player_1_chance = 1 / (1 + math.exp(skills[duel.player_2_id] - skills[duel.player_1_id]))
+        wins = [0, 0]
+        for _ in range(2 * settings.MATCH_WINS_NEEDED - 1):
+            wins[rng.random() >= player_1_chance] += 1
+            if max(wins) == settings.MATCH_WINS_NEEDED or rng.random() < 0.03:
+                break
+        results[duel] = tuple(wins)
+
+    models.Duel.set_results(results)
+
+
+def generate_tournament(name: str, players: typing.Dict[models.Player, float], rng: random.Random,
+                        rounds: int = None, finish=True) -> models.Tournament:
+    """
+    Creates a tournament of players and plays rounds of it, by default as many as Swiss needs for a winner.
+
+    Odd numbers of players get a bye, like in the app.
+    """
+    tournament = models.Tournament.objects.create(name=name, teams={})
+    tournament.players.add(*players)  # pairs the first round
+    if rounds is None:
+        rounds = max(1, math.ceil(math.log2(len(players))))
+
+    current_round = tournament.current_round
+    for number in range(rounds):
+        play_round(current_round, players, rng)
+        if number + 1 == rounds:
+            break
+        try:
+            current_round = tournament.start_next_round()
+        except models.PairingError:
+            break
+
+    if finish:
+        tournament.finish()
+    return tournament
+
+
+def generate_history(player_count: int, tournament_count: int, seed: int = 0) -> typing.Dict[models.Player, float]:
+    """
+    Creates player_count players and tournament_count finished tournaments between them.
+
+    Every tournament is joined by a random half to all of the players, so some of them have byes.
+    Returns the players with their skill.
+    """
+    rng = random.Random(seed)
+    skills = generate_players(player_count, seed)
+    for index in range(tournament_count):
+        size = rng.randint(max(2, player_count // 2), player_count)
+        attending = dict(rng.sample(list(skills.items()), size))
+        generate_tournament(f"Generated {index + 1}", attending, rng)
+
+    return skills
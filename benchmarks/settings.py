@@ -0,0 +1,16 @@
+"""Settings for the benchmarks: the test settings with SQLite standing in for postgres unless DATABASE_URL is set."""
+import json
+import os
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:////tmp/mtg_pairings_benchmarks.db')
+
+from config.test_settings import *  # noqa
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    from django.contrib.postgres.fields import jsonb
+
+    # SQLite has no jsonb, so the JSONFields are stored as text and the tables are created without the
+    # postgres specific migrations.
+    jsonb.JSONField.get_prep_value = lambda self, value: None if value is None else json.dumps(value)
+    jsonb.JSONField.from_db_value = lambda self, value, *_: json.loads(value) if isinstance(value, str) else value
+    MIGRATION_MODULES = {'mtg_pairings': None}
@@ -0,0 +1,86 @@
+"""
+Boot time and memory of a worker, run with ``python -m benchmarks.startup``.
+
+Every variant imports the WSGI application and the URLs in a fresh interpreter under ``-X importtime``, like a
+gunicorn worker does before it serves its first request. "lazy" is how workers boot, "eager" additionally imports
+what the models imported at module level before the engine was split off, "engine" is a worker after its first
+standing or pairing.
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import typing
+
+import attr
+
+VARIANTS = {
+    "lazy": "",
+    "eager": "import networkx.algorithms.matching, numpy",
+    "engine": "import mtg_pairings.engine",
+}
+
+BOOT = """
+import os, resource, sys, time
+start = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+from config.wsgi import application
+import config.urls
+{imports}
+seconds = time.perf_counter() - start
+print(seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, len(sys.modules))
+"""
+
+IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| \s*(\S+)$")
+
+
+@attr.s(frozen=True)
+class Boot:
+    variant: str = attr.ib()
+    seconds: float = attr.ib()
+    max_rss: int = attr.ib()  # bytes
+    modules: int = attr.ib()
+    # (cumulative microseconds, package) of every top-level package, including what it imports itself
+    packages: typing.List[typing.Tuple[int, str]] = attr.ib(repr=False)
+
+
+def boot(variant: str) -> Boot:
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", BOOT.format(imports=VARIANTS[variant])],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    seconds, max_rss, modules = completed.stdout.split()
+    packages = [(int(match.group(2)), match.group(3))
+                for match in map(IMPORT_TIME.match, completed.stderr.splitlines())
+                if match is not None and "." not in match.group(3)]
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return Boot(variant, float(seconds), int(max_rss) * (1 if sys.platform == "darwin" else 1024), int(modules),
+                sorted(packages, reverse=True))
+
+
+def median_boot(variant: str, repeat: int) -> Boot:
+    boots = [boot(variant) for _ in range(repeat)]
+    return Boot(variant, statistics.median(b.seconds for b in boots), int(statistics.median(b.max_rss for b in boots)),
+                boots[0].modules, boots[0].packages)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description=__doc__)
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument("--repeat", type=int, default=5, help="boots per variant, the median is reported")
+    parser.add_argument("--top", type=int, default=10, help="how many of the slowest packages to show")
+    arguments = parser.parse_args(argv)
+
+    boots = [median_boot(variant, arguments.repeat) for variant in arguments.variants]
+    for measured in boots:
+        print(f"{measured.variant:<10} {measured.seconds * 1000:>8.1f} ms {measured.max_rss / 2 ** 20:>8.1f} MiB "
+              f"max RSS {measured.modules:>6} modules")
+
+    for measured in boots:
+        print(f"\nslowest packages of {measured.variant}:")
+        for microseconds, package in measured.packages[:arguments.top]:
+            print(f"  {microseconds / 1000:>8.1f} ms {package}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import json
+import random
+import statistics
+import time
+import typing
+
+import attr
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from benchmarks import generator
+from mtg_pairings import engine, models
+
+TIERS = (8, 64, 256, 1024)
+
+
+@attr.s(frozen=True)
+class Measurement:
+    name: str = attr.ib()
+    tier: int = attr.ib()
+    seconds: float = attr.ib()  # the median of all runs
+    queries: int = attr.ib()
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}[{self.tier}]"
+
+
+def measure(name: str, tier: int, function: typing.Callable, setup: typing.Callable = None, repeat=5) -> Measurement:
+    """
+    Times function and counts its queries.
+
+    Every run happens in a transaction that is rolled back afterwards, so function may change the database.
+    setup runs in the same transaction before the timer starts and its result is passed to function.
+    """
+    timings, queries = [], []
+    for _ in range(repeat):
+        with transaction.atomic():
+            argument = setup() if setup is not None else None
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                if setup is None:
+                    function()
+                else:
+                    function(argument)
+                timings.append(time.perf_counter() - start)
+            queries.append(len(captured))
+            transaction.set_rollback(True)
+
+    return Measurement(name, tier, statistics.median(timings), max(queries))
+
+
+def run_tier(player_count: int, tournament_count: int, seed: int = 0, repeat=5) -> typing.List[Measurement]:
+    """Generates a history of player_count players and measures all hot paths on it."""
+    client = Client()
+    client.force_login(User.objects.create_user("benchmark", first_name="Benchmark"))
+
+    rng = random.Random(seed)
+    skills = generator.generate_history(player_count, tournament_count, seed)
+    players = list(skills)
+    # the tournament that is being played: its first round has results and the second can be paired.
+    tournament = generator.generate_tournament("Benchmark", skills, rng, rounds=1, finish=False)
+
+    def new_tournament():
+        new = models.Tournament.objects.create(name="First round", teams={})
+        # the through model doesn't send m2m_changed, which would pair the first round already.
+        models.Tournament.players.through.objects.bulk_create(
+            models.Tournament.players.through(tournament=new, player=player) for player in players
+        )
+        if len(players) % 2:
+            models.Tournament.players.through.objects.create(tournament=new, player=models.Player.bye())
+        return new
+
+    def fresh(tournaments=models.Tournament.objects):
+        return tournaments.get(pk=tournament.pk)
+
+    def get(url: str):
+        response = client.get(url)
+        assert response.status_code == 200, response.status_code
+
+    cases = [
+        ("start_first_round", lambda new: new.start_first_round(), new_tournament),
+        ("start_next_round", lambda current: current.start_next_round(), fresh),
+        ("Tournament.standing", lambda current: current.standing, fresh),
+        ("Tournament.standing prefetched", lambda current: current.standing,
+         lambda: fresh(models.Tournament.with_rounds())),
+        ("Player.all_time_standing", models.Player.all_time_standing, None),
+        ("ranking", lambda: engine.ranking(models.Duel.without_freewins(), models.Player.playing()), None),
+        ("ranking draw", lambda: engine.ranking(models.Duel.without_freewins(), models.Player.playing(), draw=True),
+         None),
+        ("ShowTournament", lambda: get(tournament.get_absolute_url()), None),
+        ("ListPlayers", lambda _: get(reverse("player_list")), cache.clear),
+    ]
+    return [
+        measure(name, player_count, function, setup, repeat=1 if name == "ranking draw" else repeat)
+        for name, function, setup in cases
+    ]
+
+
+def compare(measurements: typing.Iterable[Measurement], baseline: dict, threshold: float) -> typing.List[str]:
+    """Describes the measurements that are slower than threshold times their baseline or need more queries."""
+    regressions = []
+    for measurement in measurements:
+        previous = baseline.get(measurement.key)
+        if previous is None:
+            continue
+        if measurement.seconds > previous["seconds"] * (1 + threshold):
+            regressions.append(f"{measurement.key} took {measurement.seconds * 1000:.1f} ms, "
+                               f"the baseline is {previous['seconds'] * 1000:.1f} ms")
+        if measurement.queries > previous["queries"]:
+            regressions.append(f"{measurement.key} ran {measurement.queries} queries, "
+                               f"the baseline is {previous['queries']}")
+
+    return regressions
+
+
+def load_baseline(path: str) -> dict:
+    try:
+        with open(path) as baseline:
+            return json.load(baseline)["measurements"]
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path: str, measurements: typing.Iterable[Measurement]):
+    with open(path, "w") as baseline:
+        json.dump({
+            "database": connection.vendor,
+            "measurements": {
+                measurement.key: {"seconds": measurement.seconds, "queries": measurement.queries}
+                for measurement in measurements
+            },
+        }, baseline, indent=2, sort_keys=True)
@@ -0,0 +1,46 @@
+"""
+gunicorn settings, see the Procfile.
+
+With GUNICORN_PRELOAD the application and the engine are loaded once by the master process, so the workers share
+numpy's memory copy-on-write instead of each importing it for its first standing. Code changes then need a restart
+of the master instead of a reload of the workers.
+
+Every open live tournament page holds a request (see mtg_pairings.events), so workers serve requests in threads
+instead of one at a time. GUNICORN_WORKER_CLASS=gevent serves more of them if gevent is installed.
+
+Any worker may answer a scrape of /metrics, so the workers add up their metrics in the files of METRICS_DIR, see
+mtg_pairings.metrics. It defaults to a new temporary directory per server, a given one is cleared on start.
+"""
+import os
+import pathlib
+import tempfile
+
+import environ
+
+ENV = environ.Env()
+
+# set before the application is loaded, the workers inherit it. A reload reads this file again but keeps it.
+if "METRICS_DIR" not in os.environ:
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="mtg-pairings-metrics-")
+
+preload_app = ENV.bool("GUNICORN_PRELOAD", default=False)
+worker_class = ENV("GUNICORN_WORKER_CLASS", default="gthread")
+threads = ENV.int("GUNICORN_THREADS", default=32)
+
+
+def on_starting(server):
+    for path in pathlib.Path(os.environ["METRICS_DIR"]).glob("*.json"):
+        path.unlink()  # counts of the last server, Prometheus sees the reset like a restart
+
+
+def worker_exit(server, worker):
+    from mtg_pairings import metrics
+
+    metrics.flush()  # the samples of the last FLUSH_SECONDS
+
+
+def when_ready(server):
+    if preload_app:
+        import mtg_pairings.engine  # noqa: F401
+
+        server.log.info("Preloaded mtg_pairings.engine")
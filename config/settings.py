@@ -59,6 +59,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'mtg_pairings.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -146,6 +147,20 @@ CRISPY_TEMPLATE_PACK = 'bootstrap4'
 CRISPY_FAIL_SILENTLY = not DEBUG
 
 MATCH_WINS_NEEDED = 2
+# pair the first round with a maximum weight matching over all pairs instead of by ranking order.
+EXACT_FIRST_ROUND_MATCHING = ENV.bool('EXACT_FIRST_ROUND_MATCHING', default=False)
+
+# wall time and SQL of views and hot functions, see mtg_pairings.metrics
+METRICS_ENABLED = ENV.bool('METRICS_ENABLED', default=True)
+# the worker processes of a server add up their metrics in files there, config/gunicorn.py sets it
+METRICS_DIR = ENV('METRICS_DIR', default=None)
+
+# changes with every deploy so pages cached by browsers are rendered again, needs Heroku's dyno metadata
+RELEASE = ENV('HEROKU_RELEASE_VERSION', default='')
+
+# live tournament pages, see mtg_pairings.events
+EVENT_POLL_SECONDS = ENV.float('EVENT_POLL_SECONDS', default=1.0)
+EVENT_STREAM_SECONDS = ENV.float('EVENT_STREAM_SECONDS', default=300.0)
 
 if ENVIRONMENT == "HEROKU":
     import django_heroku
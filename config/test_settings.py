@@ -3,6 +3,7 @@ import os
 os.environ.setdefault('DJANGO_SECRET_KEY', 'TEST_KEY')
 os.environ.setdefault('DJANGO_DEBUG', 'True')
 os.environ.setdefault('DJANGO_ALLOWED_HOSTS', '')
-os.environ.setdefault('DATABASE_URL', 'sqlite:////tmp/test_sqlite.db')
+# the models use postgres' JSONField, so the tests need a postgres server, point DATABASE_URL to yours.
+os.environ.setdefault('DATABASE_URL', 'postgres://postgres@localhost:5432/mtg_pairings')
 
-from .settings import *
\ No newline at end of file
+from .settings import *
@@ -6,3 +6,4 @@ admin.site.register(models.Player)
 admin.site.register(models.Tournament)
 admin.site.register(models.Round)
 admin.site.register(models.Duel)
+admin.site.register(models.Job)
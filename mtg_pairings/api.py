@@ -0,0 +1,212 @@
+"""
+Read-only JSON API for scripts and displays.
+
+Rows are read with .values() instead of model instances, only a standing that no event recorded is computed from the
+duels. Lists are paginated with keyset cursors, the "next" URL of a page continues after its last item, so every page
+costs the same however far in it is. Like the pages, responses answer conditional requests, so polling an unchanged
+resource is cheap.
+"""
+import base64
+import binascii
+import datetime
+import json
+import typing
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views import generic
+
+from . import models
+from .views import conditional
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+DUEL_FIELDS = ("id", "player_1", "player_2", "player_1_wins", "player_2_wins", "is_bye")
+STANDING_FIELDS = ("player", "url", "match_wins", "match_losses", "wins", "losses",
+                   "opponent_match_win_percentage", "opponent_win_percentage")
+
+
+class BadRequest(Exception):
+    pass
+
+
+def encode_cursor(values: typing.Sequence) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode()
+
+
+def of_type(*types: type) -> typing.Callable:
+    def parse(value):
+        if isinstance(value, bool) or not isinstance(value, types):
+            raise TypeError(f"{value!r} is not a {' or '.join(t.__name__ for t in types)}")
+        return value
+    return parse
+
+
+def parse_date(value) -> datetime.date:
+    return datetime.datetime.strptime(of_type(str)(value), "%Y-%m-%d").date()
+
+
+def decode_cursor(cursor: str, *parsers: typing.Callable) -> list:
+    """The values of a cursor converted by one parser each, cursors with other values are a BadRequest."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError(f"expected {len(parsers)} values")
+        return [parse(value) for parse, value in zip(parsers, values)]
+    except (binascii.Error, ValueError, TypeError) as error:
+        raise BadRequest(f"Invalid cursor {cursor!r}.") from error
+
+
+class ApiView(LoginRequiredMixin, generic.View):
+    raise_exception = True  # answer 403 instead of redirecting to the login page
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except BadRequest as error:
+            return JsonResponse({"error": str(error)}, status=400)
+
+    def limit(self) -> int:
+        try:
+            return min(max(int(self.request.GET.get("limit", PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            raise BadRequest("limit has to be a number.")
+
+    def cursor(self, *parsers: typing.Callable) -> typing.Optional[list]:
+        """The values of the ?after cursor, see decode_cursor()."""
+        cursor = self.request.GET.get("after")
+        return decode_cursor(cursor, *parsers) if cursor else None
+
+    def page(self, rows: typing.List[dict], limit: int, cursor_of: typing.Callable[[dict], list]) -> JsonResponse:
+        """The page of rows, which are fetched with one more than limit to tell if there is a next page."""
+        next_url = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            query = self.request.GET.copy()
+            query["after"] = encode_cursor(cursor_of(rows[-1]))
+            next_url = f"{self.request.path}?{query.urlencode()}"
+
+        return JsonResponse({"results": rows, "next": next_url})
+
+
+def standing_rows(tournament_id: int) -> typing.List[dict]:
+    """The standing of a tournament, from its last standing event if it has one."""
+    rows = models.TournamentEvent.objects.filter(
+        tournament_id=tournament_id, kind=models.TournamentEvent.STANDING
+    ).order_by("-pk").values_list("data", flat=True).first()
+    if rows is not None:
+        return [dict(zip(STANDING_FIELDS, row)) for row in rows["rows"]]
+
+    return [dict(zip(STANDING_FIELDS, (
+        performance.player.name, performance.player.get_absolute_url(), performance.match_wins,
+        performance.match_losses, performance.wins, performance.losses,
+        performance.opponent_match_win_percentage, performance.opponent_win_percentage
+    ))) for performance in models.Tournament(pk=tournament_id).standing]
+
+
+@conditional(lambda **_: [models.DataVersion.TOURNAMENTS])
+class ListTournaments(ApiView):
+    """Tournaments from the latest, ?finished=true or false to filter."""
+
+    def get(self, request, *args, **kwargs):
+        tournaments = models.Tournament.objects.order_by("-date", "-id")
+        if "finished" in request.GET:
+            tournaments = tournaments.filter(finished=request.GET["finished"].lower() == "true")
+
+        cursor = self.cursor(parse_date, of_type(int))
+        if cursor is not None:
+            date, pk = cursor
+            tournaments = tournaments.filter(Q(date__lt=date) | Q(date=date, id__lt=pk))
+
+        limit = self.limit()
+        rows = list(tournaments.values("id", "name", "date", "finished")[:limit + 1])
+        for row in rows:
+            row["url"] = reverse("api_tournament", args=[row["id"]])
+        return self.page(rows, limit, lambda row: [row["date"], row["id"]])
+
+
+@conditional(lambda pk: [models.DataVersion.tournament(pk)])
+class ShowTournament(ApiView):
+    """A tournament with its players, rounds, duels and standing."""
+
+    def get(self, request, *args, pk: int, **kwargs):
+        tournament = models.Tournament.objects.filter(pk=pk).values("id", "name", "date", "finished", "teams").first()
+        if tournament is None:
+            raise Http404(f"No tournament {pk}.")
+
+        rounds = {number: {"number": number, "duels": []} for number in models.Round.objects.filter(
+            tournament_id=pk).order_by("number").values_list("number", flat=True)}
+        for duel in models.Duel.objects.filter(tournament_id=pk).order_by("id").values("round__number", *DUEL_FIELDS):
+            rounds[duel.pop("round__number")]["duels"].append(duel)
+
+        tournament["players"] = list(models.Player.objects.filter(
+            tournaments=pk, is_bye=False).order_by("name").values_list("name", flat=True))
+        tournament["rounds"] = list(rounds.values())
+        tournament["standing"] = standing_rows(pk)
+        return JsonResponse(tournament)
+
+
+@conditional(lambda pk: [models.DataVersion.player(pk), models.DataVersion.TOURNAMENTS])
+class ShowPlayer(ApiView):
+    """A player's all-time record and their record in each of their tournaments."""
+
+    def get(self, request, *args, pk: str, **kwargs):
+        if not models.Player.objects.filter(pk=pk).exists():
+            raise Http404(f"No player {pk}.")
+
+        fields = models.PlayerStats.FIELDS
+        records = {tournament: dict(zip(fields, record)) for tournament, *record in
+                   models.PlayerStats.objects.filter(player_id=pk).values_list("tournament", *fields)}
+        no_record = dict.fromkeys(fields, 0)
+        all_time = records.get(None, no_record)
+        tournaments = models.Tournament.objects.filter(players=pk).order_by("-date", "-id").values("id", "name", "date")
+        tournaments = [dict(tournament, **records.get(tournament["id"], no_record)) for tournament in tournaments]
+
+        return JsonResponse({"name": pk, "all_time": all_time, "tournaments": tournaments})
+
+
+@conditional(lambda **_: [models.DataVersion.RESULTS])
+class Ranking(ApiView):
+    """The all-time record of the players ordered by PageRank."""
+
+    def get(self, request, *args, **kwargs):
+        models.RankingSnapshot.refresh()
+        stats = models.PlayerStats.all_time().filter(pagerank__isnull=False).order_by("-pagerank", "player")
+
+        cursor = self.cursor(of_type(int, float), of_type(str))
+        if cursor is not None:
+            score, player = cursor
+            stats = stats.filter(Q(pagerank__lt=score) | Q(pagerank=score, player__gt=player))
+
+        limit = self.limit()
+        rows = list(stats.values("player", "pagerank", *models.PlayerStats.FIELDS)[:limit + 1])
+        for row in rows:
+            row["score"] = row.pop("pagerank")
+        return self.page(rows, limit, lambda row: [row["score"], row["player"]])
+
+
+class ExportDuels(ApiView):
+    """
+    Every duel as one JSON object per line, streamed in constant memory.
+
+    ?tournament= exports the duels of one tournament, ?after= continues after a duel id.
+    """
+
+    def get(self, request, *args, **kwargs):
+        duels = models.Duel.objects.order_by("id")
+        try:
+            if "tournament" in request.GET:
+                duels = duels.filter(tournament_id=int(request.GET["tournament"]))
+            if "after" in request.GET:
+                duels = duels.filter(id__gt=int(request.GET["after"]))
+        except ValueError:
+            raise BadRequest("tournament and after have to be numbers.")
+
+        lines = (json.dumps(duel, cls=DjangoJSONEncoder) + "\n" for duel in duels.values(
+            "tournament", "round__number", *DUEL_FIELDS
+        ).iterator(chunk_size=2000))
+        return StreamingHttpResponse(lines, content_type="application/x-ndjson")
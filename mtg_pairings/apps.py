@@ -1,6 +1,6 @@
 import logging
 
-from django.apps import AppConfig
+from django.apps import AppConfig, apps as global_apps
 from django.db.models.signals import post_migrate
 
 
@@ -14,7 +14,7 @@ class MtgPairingsConfig(AppConfig):
         post_migrate.connect(create_player_group, sender=self)
 
 
-def create_player_group(apps, app_config: MtgPairingsConfig, verbosity, *args, **kwargs):
+def create_player_group(app_config: MtgPairingsConfig, verbosity=2, apps=global_apps, **kwargs):
     Permission = apps.get_model("auth", "Permission")
     Group = apps.get_model("auth", "Group")
 
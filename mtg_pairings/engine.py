@@ -0,0 +1,403 @@
+"""
+The numeric side of standings, pairings and the ranking.
+
+numpy and networkx take a good part of a worker's boot time and memory, so the models only import this module
+once they calculate something (see models.engine). networkx and matplotlib are imported by the functions that
+need them.
+"""
+import base64
+import collections
+import itertools
+import logging
+import typing
+from typing import List
+
+import numpy
+from django.db import models
+
+from mtg_pairings import metrics
+from mtg_pairings.models import Performance, Player, sort_standing
+
+
+def batch_performances(players: typing.Sequence[Player], match_wins, match_losses, wins, losses,
+                       opponent_match_win_percentages=None, opponent_win_percentages=None) -> List[Performance]:
+    """The performances of players from columns of their records, with all scores calculated at once."""
+    scores = percentages(match_wins, match_losses) * 100 + percentages(wins, losses)
+    if opponent_match_win_percentages is None:
+        opponent_match_win_percentages = numpy.zeros(len(players))
+    if opponent_win_percentages is None:
+        opponent_win_percentages = numpy.zeros(len(players))
+
+    columns = (numpy.asarray(column).tolist() for column in (
+        match_wins, match_losses, wins, losses, opponent_match_win_percentages, opponent_win_percentages, scores
+    ))
+    return [Performance(*record) for record in zip(players, *columns)]
+
+
+def results_standing(results: typing.Iterable[tuple], players) -> List[Performance]:
+    """Like standing() for duel results already loaded as (player_1, player_2, player_1_wins, player_2_wins)."""
+    players = list(players)
+    player_index = {player.pk: index for index, player in enumerate(players)}
+
+    player_1, player_2, player_1_wins, player_2_wins = result_columns(results, player_index)
+
+    player_1_won = player_1_wins > player_2_wins
+    player_2_won = player_2_wins > player_1_wins
+
+    def per_player(as_player_1, as_player_2):
+        return (group_sum(player_1, as_player_1, len(players))
+                + group_sum(player_2, as_player_2, len(players)))
+
+    match_wins = per_player(player_1_won, player_2_won).astype(int)
+    match_losses = per_player(player_2_won, player_1_won).astype(int)
+    wins = per_player(player_1_wins, player_2_wins).astype(int)
+    losses = per_player(player_2_wins, player_1_wins).astype(int)
+
+    opponent_match_win_percentages, opponent_win_percentages = opponent_percentages(
+        player_1, player_2, percentages(match_wins, match_losses), percentages(wins, losses)
+    )
+    return sort_standing(batch_performances(players, match_wins, match_losses, wins, losses,
+                                            opponent_match_win_percentages, opponent_win_percentages))
+
+
+TIEBREAKER_FLOOR = 1 / 3  # the lowest match or game win percentage an opponent counts with
+
+
+def add_tiebreakers(performances: List[Performance], player_1, player_2) -> List[Performance]:
+    """
+    Sets the opponents' match and game win percentages of performances and returns them.
+
+    player_1 and player_2 are arrays of indices into performances of who played against whom, see opponent_percentages.
+    """
+    opponent_match_win_percentages, opponent_win_percentages = opponent_percentages(
+        player_1, player_2,
+        [performance.match_win_percentage for performance in performances],
+        [performance.win_percentage for performance in performances],
+    )
+    for index, performance in enumerate(performances):
+        performance.opponent_match_win_percentage = float(opponent_match_win_percentages[index])
+        performance.opponent_win_percentage = float(opponent_win_percentages[index])
+
+    return performances
+
+
+def opponent_percentages(player_1, player_2, match_win_percentages, win_percentages):
+    """
+    The average match and game win percentages of every player's opponents.
+
+    player_1 and player_2 are index arrays of who played against whom, duels with a negative index (like byes)
+    don't count. The opponents' percentages are floored at TIEBREAKER_FLOOR, the cost is a couple of bincounts
+    over the duels.
+    """
+    size = len(match_win_percentages)
+    played = (player_1 >= 0) & (player_2 >= 0)
+    player_1, player_2 = player_1[played], player_2[played]
+    opponents = numpy.bincount(player_1, minlength=size) + numpy.bincount(player_2, minlength=size)
+
+    def opponents_mean(percentages):
+        percentages = numpy.maximum(numpy.array(percentages, dtype=float).reshape(-1), TIEBREAKER_FLOOR)
+        summed = (numpy.bincount(player_1, weights=percentages[player_2], minlength=size)
+                  + numpy.bincount(player_2, weights=percentages[player_1], minlength=size))
+        return numpy.divide(summed, opponents, out=numpy.zeros(size), where=opponents > 0)
+
+    return opponents_mean(match_win_percentages), opponents_mean(win_percentages)
+
+
+def percentages(wins, losses):
+    """wins / (wins + losses) for columns of records, 0 where nothing was played."""
+    wins, losses = numpy.asarray(wins, dtype=float), numpy.asarray(losses, dtype=float)
+    played = wins + losses
+    return numpy.divide(wins, played, out=numpy.zeros(played.shape), where=played > 0)
+
+
+def result_columns(results, player_index):
+    """Splits duel results into index and win columns. Players not in player_index get the index -1."""
+    rows = numpy.array([
+        (player_index.get(player_1, -1), player_index.get(player_2, -1), player_1_wins, player_2_wins)
+        for player_1, player_2, player_1_wins, player_2_wins, *_ in results
+    ], dtype=int).reshape(-1, 4)
+
+    return rows.T
+
+
+def group_sum(indices, values, length: int):
+    """Sums up values grouped by indices, ignoring negative indices."""
+    known = indices >= 0
+    return numpy.bincount(indices[known], weights=values[known], minlength=length)
+
+
+def swiss_pairing(opponents: typing.Sequence[int], groups: typing.Sequence[int] = None,
+                  max_steps=10_000) -> typing.Optional[typing.List[typing.Tuple[int, int]]]:
+    """
+    Pairs the players 0..n-1 so nobody meets a previous opponent again.
+
+    Players are ordered from best to worst and opponents[i] is a bitset of the players i already met. groups[i] is
+    the score group of player i, players of a group are next to each other, by default all are in one group.
+    Every player is paired with the best player left that they haven't met, backtracking when that gets stuck.
+    If that takes more than max_steps, the pairing falls back to _bracket_pairing(). Returns the pairs or None if
+    no pairing exists.
+    """
+    size = len(opponents)
+    if size % 2:
+        return None
+
+    # the backtracking goes as deep as there are pairs, so it keeps its own stack instead of recursing.
+    steps = 0
+    pairs = []  # (player, opponent, the other unpaired players, the opponents left to try) of every pair made
+    unpaired = (1 << size) - 1
+    while unpaired:
+        player = (unpaired & -unpaired).bit_length() - 1
+        rest = unpaired & ~(1 << player)
+        candidates = rest & ~opponents[player]
+        while not candidates:  # backtrack to the last pair with another opponent to try
+            if not pairs:
+                return None
+            player, _, rest, candidates = pairs.pop()
+
+        steps += 1
+        if steps > max_steps:
+            break
+        opponent = (candidates & -candidates).bit_length() - 1
+        pairs.append((player, opponent, rest, candidates & (candidates - 1)))
+        unpaired = rest & ~(1 << opponent)
+    else:
+        return [(player, opponent) for player, opponent, _, _ in pairs]
+
+    return _bracket_pairing(opponents, [0] * size if groups is None else groups)
+
+
+def _bracket_pairing(opponents: typing.Sequence[int], groups: typing.Sequence[int]) -> typing.Optional[
+        typing.List[typing.Tuple[int, int]]]:
+    """
+    Pairs score group by score group with maximum weight matchings that prefer opponents close in the standing.
+
+    Players a group can't pair float down to the next one. Only if that leaves players at the bottom unpaired,
+    everybody is matched at once, preferring opponents of the same group and then close in the standing.
+    Matching a group takes cubic time in its size, so matching them one by one is much faster than all at once.
+    """
+    size = len(opponents)
+    pairs, floating = [], []
+    for _, group in itertools.groupby(range(size), key=groups.__getitem__):
+        players = floating + list(group)
+        matching = _matching(opponents, players, lambda player, opponent: -(player - opponent) ** 2)
+        paired = {player for pair in matching for player in pair}
+        pairs += matching
+        floating = [player for player in players if player not in paired]
+
+    if floating:
+        penalty = size ** 3  # more than all squared distances in the standing of a pairing together
+        pairs = _matching(opponents, range(size), lambda player, opponent: (
+            -penalty * (groups[player] - groups[opponent]) ** 2 - (player - opponent) ** 2))
+        if len(pairs) * 2 < size:
+            return None
+
+    return sorted(tuple(sorted(pair)) for pair in pairs)
+
+
+def _matching(opponents: typing.Sequence[int], players: typing.Iterable[int],
+              weight: typing.Callable[[int, int], int]) -> typing.List[typing.Tuple[int, int]]:
+    """A maximum weight matching of the most players that haven't met, weight scores a pair of them."""
+    import networkx.algorithms.matching
+
+    graph = networkx.Graph()
+    graph.add_weighted_edges_from(
+        (player, opponent, weight(player, opponent))
+        for player, opponent in itertools.combinations(players, r=2)
+        if not opponents[player] >> opponent & 1
+    )
+    return list(networkx.algorithms.matching.max_weight_matching(graph, maxcardinality=True))
+
+
+def rankings_of(players: typing.Iterable[Player], player_ranking: typing.Dict[Player, float]) -> typing.Dict[
+        Player, float]:
+    """The ranking of players, those that are not ranked yet get the mean ranking."""
+    default = sum(player_ranking.values()) / len(player_ranking) if player_ranking else 0.0
+    return {player: player_ranking.get(player, default) for player in players}
+
+
+def ranking_pairing(players: typing.Iterable[Player], player_ranking: typing.Dict[Player, float],
+                    exact=False) -> typing.List[typing.Tuple[Player, Player]]:
+    """
+    Pairs players so the summed penalty() of their rankings is maximal.
+
+    Pairing the players in order of their ranking already does that, because the penalty only grows with
+    the distance of the squared ranks. With exact a maximum weight matching over all pairs is used instead,
+    which takes cubic time in the number of players. Players without a ranking are ranked in the middle.
+    """
+    player_ranking = rankings_of(players, player_ranking)
+    players = list(player_ranking)
+    if exact:
+        import networkx.algorithms.matching
+
+        graph = networkx.Graph()
+
+        graph.add_weighted_edges_from(
+            (player, opponent, penalty(player_ranking[player], player_ranking[opponent]))
+            for player, opponent in itertools.combinations(players, r=2)
+        )
+
+        return list(networkx.algorithms.matching.max_weight_matching(graph, maxcardinality=True))
+
+    ranked_players = sorted(players, key=lambda p: (player_ranking[p], p.name), reverse=True)
+    return list(zip(ranked_players[::2], ranked_players[1::2]))
+
+
+def penalty(rank_1: float, rank_2: float) -> float:
+    # negative weight to create min matching.
+    return -((rank_1 ** 2 - rank_2 ** 2) ** 2)
+
+
+def pagerank(sources, targets, weights, size: int, alpha=0.85, tol=1.0e-10, max_iter=1000, start=None):
+    """
+    Calculates the PageRank of weighted edges source -> target between size nodes by power iteration.
+
+    The edges are only ever multiplied as sparse (source, target, weight) arrays, so every iteration is linear
+    in the number of edges. Nodes without outgoing weight distribute their rank evenly like networkx does.
+    start is an optional vector to start iterating from instead of the uniform distribution.
+    """
+    sources, targets, weights = (numpy.asarray(array) for array in (sources, targets, weights))
+    weights = weights.astype(float)
+    out_weights = numpy.bincount(sources, weights=weights, minlength=size)
+    dangling = out_weights == 0
+    transitions = numpy.divide(weights, out_weights[sources], out=numpy.zeros_like(weights), where=weights > 0)
+
+    if start is None:
+        ranks = numpy.full(size, 1.0 / size)
+    else:
+        ranks = numpy.asarray(start, dtype=float) / numpy.sum(start)
+
+    for _ in range(max_iter):
+        previous = ranks
+        ranks = alpha * numpy.bincount(targets, weights=previous[sources] * transitions, minlength=size)
+        ranks += (alpha * previous[dangling].sum() + 1 - alpha) / size
+        if numpy.abs(ranks - previous).sum() < size * tol:
+            break
+    else:
+        logging.getLogger(__name__).warning("PageRank did not converge in %d iterations", max_iter)
+
+    return ranks
+
+
+def win_graph(duels, players) -> typing.Tuple[typing.Dict[Player, int], typing.List[typing.Tuple[Player, Player, int]]]:
+    """
+    Builds the graph of wins between players.
+
+    Returns the nodes mapped to consecutive indices and weighted edges that point from the loser to the winner,
+    weighted with the wins against them.
+    """
+    player_mapping = {
+        player.name: player for player in players
+    }
+
+    # don't count free wins
+    nodes = {player: index for index, player in enumerate({player for player in players if not player.is_bye})}
+
+    duels = duels.filter(  # only duels that contain any wins make sense for ranking
+        models.Q(player_1_wins__gt=0) | models.Q(player_2_wins__gt=0)
+    ).values("player_1", "player_1_wins", "player_2", "player_2_wins")
+
+    winning_map = {
+        player: collections.defaultdict(int) for player in players
+    }
+
+    for duel in duels:
+        player_1 = player_mapping[duel["player_1"]]
+        player_2 = player_mapping[duel["player_2"]]
+        winning_map[player_1][player_2] += duel["player_1_wins"]
+        winning_map[player_2][player_1] += duel["player_2_wins"]
+
+    edges = [(opponent, player, wins) for player, wins_against in winning_map.items()
+             for opponent, wins in wins_against.items()]
+    for opponent, player, _ in edges:
+        nodes.setdefault(opponent, len(nodes))
+        nodes.setdefault(player, len(nodes))
+
+    return nodes, edges
+
+
+@metrics.instrument
+def ranking(duels, players, draw=False, start: typing.Dict[Player, float] = None,
+            **kwargs) -> typing.Tuple[typing.Dict[Player, float], typing.ByteString]:
+    """
+    Ranks players by the PageRank of the graph of their wins against each other.
+
+    start optionally maps players to previous scores to start the iteration from, players missing in it
+    start with the average score. With draw the graph is also returned as a base64 encoded PNG.
+    """
+    nodes, edges = win_graph(duels, players)
+
+    if not nodes:
+        return {}, b""
+
+    if start:
+        average = sum(start.values()) / len(start)
+        kwargs["start"] = [start.get(player, average) for player in nodes]
+
+    ranks = pagerank(
+        numpy.array([nodes[opponent] for opponent, _, _ in edges], dtype=int),
+        numpy.array([nodes[player] for _, player, _ in edges], dtype=int),
+        numpy.array([wins for _, _, wins in edges], dtype=float),
+        len(nodes), **kwargs
+    )
+    pageranking = {player: ranks[index] * 100 for player, index in nodes.items()}
+
+    if draw and edges:
+        return pageranking, base64.b64encode(draw_win_graph(nodes, edges))
+
+    return pageranking, b""
+
+
+def draw_win_graph(nodes: typing.Iterable[Player], edges: typing.List[typing.Tuple[Player, Player, int]]) -> bytes:
+    """Draws the graph of wins between players as PNG. This takes seconds, don't call it while handling requests."""
+    import io
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from matplotlib.lines import Line2D
+    from matplotlib import colors
+    import networkx
+
+    graph = networkx.DiGraph()
+    graph.add_nodes_from(nodes)
+    graph.add_weighted_edges_from(edges)
+
+    # a figure of its own instead of pyplot's global one, so drawings in one process don't share any state.
+    figure = Figure(figsize=(16, 9))
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot(1, 1, 1)
+
+    pos = networkx.shell_layout(graph)
+    networkx.draw_networkx_nodes(graph, pos, node_size=700, ax=axes)
+    max_wins = max(d["weight"] for (u, v, d) in graph.edges(data=True))
+    color_values = [
+        colors.to_hex(
+            colors.hsv_to_rgb((ratio * 0.8 + 0.1, 0.9, (ratio + 1) / 2))
+        )
+        for ratio in map(lambda w: w / max_wins, range(1, max_wins + 1))
+    ]
+    legend = []
+
+    winner_edges = [(v, u, d) for (u, v, d) in graph.edges(data=True) if
+                    d["weight"] > graph[v][u]["weight"]]
+    loser_edges = [(v, u, d) for (u, v, d) in graph.edges(data=True) if
+                   d["weight"] <= graph[v][u]["weight"]]
+
+    # we want to overlay bigger wins with smaller ones
+    for wins, color in reversed(list(enumerate(color_values, start=1))):
+        # we switch directions of edges so they show to winning against.
+        # pagerank wants the direction towards the winner to show "significance"
+        w_edges = [(v, u) for (u, v, d) in winner_edges if d["weight"] == wins]
+        networkx.draw_networkx_edges(graph, pos, edgelist=w_edges, width=5, edge_color=color, arrowstyle="-|>",
+                                     ax=axes)
+        l_edges = [(v, u) for (u, v, d) in loser_edges if d["weight"] == wins]
+        networkx.draw_networkx_edges(graph, pos, edgelist=l_edges, width=2, edge_color=color, arrowstyle="-|>",
+                                     ax=axes)
+
+        legend.append(Line2D([0], [0], marker='o', color='w', label=f'{wins}', markerfacecolor=color, markersize=6))
+
+    networkx.draw_networkx_labels(graph, pos, font_size=10, ax=axes)
+
+    axes.legend(handles=legend)
+
+    bytes_io = io.BytesIO()
+    figure.savefig(bytes_io, format="png")
+    return bytes_io.getvalue()
@@ -0,0 +1,132 @@
+"""
+Live changes of tournaments as Server-Sent Events.
+
+Writes record TournamentEvents in their transaction. While anybody listens, a thread of every process polls new
+events for all of its streams with one query per EVENT_POLL_SECONDS and wakes the streams up. Streams end after
+EVENT_STREAM_SECONDS and browsers reconnect with the id of the last event they got, which replays what they missed.
+Pages connect with the id of the last event they were rendered with, so nothing between rendering and connecting is
+lost either.
+Waiting uses threading, so streams work with gunicorn's threaded workers and with gevent's patched threads.
+"""
+import json
+import logging
+import threading
+import time
+import typing
+
+from django.conf import settings
+from django.db import connection
+
+from mtg_pairings import models
+
+RETRY_MILLISECONDS = 2000
+KEEPALIVE_SECONDS = 15
+BUFFER = 1000  # events kept for the streams, more than a poll interval ever brings
+# ids are assigned before commit, so an event can become visible after one with a higher id. Polls look back
+# this many ids to find them.
+LOOKBACK = 100
+
+
+class Broker:
+    """Polls new events for the streams of this process."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.events = {}  # pk -> (tournament_id, kind, data) of the latest events
+        self.generation = 0  # incremented whenever new events arrive
+        self.floor = None  # the newest pk before the poller started
+        self.listeners = 0
+        self.polling = False
+
+    def listen(self) -> int:
+        """Registers a stream, it gets the events with a higher pk than the returned one."""
+        with self.condition:
+            self.listeners += 1
+            if not self.polling:
+                self.floor = models.TournamentEvent.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+            return max(self.events, default=self.floor)
+
+    def leave(self):
+        with self.condition:
+            self.listeners -= 1
+
+    def wait(self, generation: int, timeout: float) -> typing.Tuple[int, typing.Dict[int, tuple]]:
+        """Waits until events newer than generation arrive and returns the current generation and events."""
+        with self.condition:
+            if not self.polling:
+                self.polling = True
+                threading.Thread(target=self._poll, name="tournament events", daemon=True).start()
+            self.condition.wait_for(lambda: self.generation != generation, timeout=timeout)
+            return self.generation, dict(self.events)
+
+    def _poll(self):
+        try:
+            while True:
+                with self.condition:
+                    if not self.listeners:
+                        self.polling = False
+                        self.events = {}  # they'd be stale by the time somebody listens again
+                        return
+                    newest = max(self.events, default=self.floor)
+
+                try:
+                    self._fetch(max(self.floor, newest - LOOKBACK))
+                except Exception:
+                    logging.getLogger(__name__).exception("Polling tournament events failed")
+                    connection.close()
+                time.sleep(settings.EVENT_POLL_SECONDS)
+        finally:
+            connection.close()
+
+    def _fetch(self, after: int):
+        pks = set(models.TournamentEvent.objects.filter(pk__gt=after).values_list("pk", flat=True))
+        new_pks = pks - self.events.keys()
+        if not new_pks:
+            return
+
+        new_events = {pk: (tournament_id, kind, data) for pk, tournament_id, kind, data in
+                      models.TournamentEvent.objects.filter(pk__in=new_pks).values_list(
+                          "pk", "tournament_id", "kind", "data")}
+        with self.condition:
+            self.events.update(new_events)
+            for pk in sorted(self.events)[:-BUFFER]:
+                del self.events[pk]
+            self.generation += 1
+            self.condition.notify_all()
+
+
+BROKER = Broker()
+
+
+def message(pk: int, kind: str, data) -> str:
+    return f"id: {pk}\nevent: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def stream(tournament_id: int, last_event_id: typing.Optional[int] = None) -> typing.Iterator[str]:
+    """The events of a tournament as a Server-Sent Events stream, starting after last_event_id if given."""
+    start = BROKER.listen()
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+
+        if last_event_id is not None:
+            for pk, kind, data in models.TournamentEvent.objects.filter(
+                    tournament_id=tournament_id, pk__gt=last_event_id, pk__lte=start
+            ).values_list("pk", "kind", "data"):
+                yield message(pk, kind, data)
+        if not connection.in_atomic_block:
+            connection.close()  # the poller queries for all streams, don't keep a connection per stream
+
+        sent = set()
+        generation = None
+        deadline = time.monotonic() + settings.EVENT_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            generation, events = BROKER.wait(generation, min(KEEPALIVE_SECONDS, deadline - time.monotonic()))
+            new_events = sorted((pk, kind, data) for pk, (event_tournament_id, kind, data) in events.items()
+                                if event_tournament_id == tournament_id and pk > start and pk not in sent)
+            for pk, kind, data in new_events:
+                sent.add(pk)
+                yield message(pk, kind, data)
+            if not new_events:
+                yield ": keepalive\n\n"
+    finally:
+        BROKER.leave()
@@ -1,4 +1,5 @@
 import re
+import typing
 
 import crispy_forms.helper
 from crispy_forms import layout
@@ -19,8 +20,17 @@ class PlayerField(forms.ModelMultipleChoiceField):
 
 
 class RoundForm(forms.Form):
+    """
+    The results of all duels of a round, the fields are named after the duels' primary keys.
+
+    Pass a round whose duels and their players are prefetched to avoid a query per duel.
+    The round's primary key is submitted along, see is_for().
+    """
+    round = forms.IntegerField(widget=forms.HiddenInput(), required=False)
+
     def __init__(self, *args, round: models.Round, **kwargs):
         super().__init__(*args, **kwargs)
+        self.fields['round'].initial = round.pk
         self.helper = crispy_forms.helper.FormHelper()
         self.helper.form_id = 'current-round-form'
         self.helper.form_method = 'post'
@@ -29,11 +39,11 @@ class RoundForm(forms.Form):
         self.helper.add_input(layout.Submit('submit', 'Submit'))
         layout_rows = []
         free_win = None
-        for i, duel in enumerate(round.duels.all()):
-            player_1, player_2 = f'duel-{i}-player1', f'duel-{i}-player2'
+        self.duels = {duel.pk: duel for duel in round.duels.all()}
+        for duel in self.duels.values():
+            player_1, player_2 = f'duel-{duel.pk}-player1', f'duel-{duel.pk}-player2'
 
-            freewin = models.Player.FREEWIN()
-            if freewin in duel.players:
+            if duel.is_bye:
                 disabled = True
                 free_win = layout.Row(player_1, player_2)
             else:
@@ -53,9 +63,15 @@ class RoundForm(forms.Form):
             layout_rows.append(free_win)
 
         self.helper.layout = layout.Layout(
+            'round',
             *layout_rows,
         )
 
+    @classmethod
+    def is_for(cls, data, round: models.Round) -> bool:
+        """Whether submitted data was entered for round, a form of an earlier round has other fields."""
+        return data.get('round') == str(round.pk)
+
     def clean(self):
         cleaned_data = super().clean().copy()
 
@@ -63,7 +79,12 @@ class RoundForm(forms.Form):
             match = PATTERN.match(name)
             if match is not None:
                 player_2_id = f'duel-{match.group(1)}-player2'
-                if value < settings.MATCH_WINS_NEEDED and cleaned_data[player_2_id] < settings.MATCH_WINS_NEEDED:
+                if player_2_id not in cleaned_data:  # it's invalid already
+                    continue
+                if value is None or cleaned_data[player_2_id] is None:
+                    self.add_error(name, "Enter the wins of both players.")
+                    self.add_error(player_2_id, "")
+                elif value < settings.MATCH_WINS_NEEDED and cleaned_data[player_2_id] < settings.MATCH_WINS_NEEDED:
                     self.add_error(
                         name, f'Either player needs {settings.MATCH_WINS_NEEDED} wins.'
                     )
@@ -78,16 +99,16 @@ class RoundForm(forms.Form):
 
         return cleaned_data
 
-    def results(self):
+    def results(self) -> typing.Dict[models.Duel, typing.Tuple[int, int]]:
+        """The wins of player 1 and player 2 for every duel of the round."""
+        results = {}
         for name, value in self.cleaned_data.items():
             match = PATTERN.match(name)
             if match:
-                player_1 = models.Player.objects.get(name=self.fields[name].label)
                 player_2_id = f'duel-{match.group(1)}-player2'
-                player_2 = models.Player.objects.get(name=self.fields[player_2_id].label)
-                player_2_result = self.cleaned_data[player_2_id]
-                yield (models.Performance(player_1, wins=value, losses=player_2_result, match_wins=0, match_losses=0),
-                       models.Performance(player_2, wins=player_2_result, losses=value, match_wins=0, match_losses=0))
+                results[self.duels[int(match.group(1))]] = (value, self.cleaned_data[player_2_id])
+
+        return results
 
 
 class TournamentForm(forms.ModelForm):
@@ -113,10 +134,8 @@ class TournamentForm(forms.ModelForm):
         if players.count() < 2:
             raise forms.ValidationError("You need at least two players. More players are always more fun ;)")
         if players.count() % 2:
-            freewin = models.Player.FREEWIN()
-            assert freewin is not None, "Player.FREEWIN not set!"
-            if freewin in players:
-                raise forms.ValidationError(f"Remove the {freewin} player.")
+            if players.filter(is_bye=True).exists():
+                raise forms.ValidationError(f"Remove the {models.Player.BYE} player.")
 
         return players
 
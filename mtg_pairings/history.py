@@ -0,0 +1,249 @@
+"""
+Imports past tournaments in bulk, see the import_history command.
+
+JSON files hold a list of tournaments like /api/tournaments/<pk> returns them, only "name", "date" and the rounds'
+duels are required. CSV files have a row per duel with the columns tournament (its name), date, round, player_1,
+player_2, player_1_wins and player_2_wins, their tournaments are finished.
+
+Rows are inserted in bulk, with COPY on Postgres, so none of the signals that pair rounds, add the FREE WIN player
+or bump versions run per row. PlayerStats and the versions are updated once at the end, the ranking is recalculated
+by the next request that needs it.
+"""
+import csv
+import datetime
+import io
+import json
+import typing
+
+import attr
+from django.db import connection, models as db_models
+from django.db.transaction import atomic
+
+from mtg_pairings import metrics
+from mtg_pairings import models
+
+COPY_BATCH_SIZE = 10000  # rows per COPY statement
+CSV_FIELDS = ("tournament", "date", "round", "player_1", "player_2", "player_1_wins", "player_2_wins")
+
+
+class HistoryError(Exception):
+    """Raised if the history can't be read or imported, nothing is imported then."""
+
+
+@attr.s(frozen=True)
+class HistoricalDuel:
+    round: int = attr.ib()
+    player_1: str = attr.ib()
+    player_2: str = attr.ib()
+    player_1_wins: int = attr.ib()
+    player_2_wins: int = attr.ib()
+
+
+@attr.s
+class HistoricalTournament:
+    name: str = attr.ib()
+    date: datetime.date = attr.ib()
+    finished: bool = attr.ib(default=True)
+    teams: dict = attr.ib(factory=dict)
+    players: typing.Set[str] = attr.ib(factory=set)  # players without duels, the duels' players are added
+    duels: typing.List[HistoricalDuel] = attr.ib(factory=list)
+
+    def __str__(self):
+        return f'{self.name} on {self.date}'
+
+    @property
+    def key(self) -> typing.Tuple[str, datetime.date]:
+        return self.name, self.date
+
+    def all_players(self) -> typing.Set[str]:
+        return self.players | {player for duel in self.duels for player in (duel.player_1, duel.player_2)}
+
+
+@attr.s(frozen=True)
+class Imported:
+    tournaments: int = attr.ib()
+    rounds: int = attr.ib()
+    duels: int = attr.ib()
+    players: int = attr.ib()  # newly created ones
+    # tournaments with the name and date of one that already exists or was earlier in the history
+    skipped: typing.List[HistoricalTournament] = attr.ib(factory=list)
+
+
+def player_name(name) -> str:
+    name = str(name).strip()
+    if not name:
+        raise HistoryError("Player names can't be empty.")
+    return models.Player.BYE if name.upper() == models.Player.BYE else models.Player.normalize_name(name)
+
+
+def parse_date(value) -> datetime.date:
+    try:
+        return datetime.datetime.strptime(str(value).strip(), "%Y-%m-%d").date()
+    except ValueError as error:
+        raise HistoryError(f"Invalid date {value!r}, use YYYY-MM-DD.") from error
+
+
+def parse_duel(number, player_1, player_2, player_1_wins, player_2_wins) -> HistoricalDuel:
+    try:
+        number, player_1_wins, player_2_wins = int(number), int(player_1_wins), int(player_2_wins)
+    except (TypeError, ValueError) as error:
+        raise HistoryError("Rounds and wins have to be numbers.") from error
+    if number < 1 or player_1_wins < 0 or player_2_wins < 0:
+        raise HistoryError("Rounds start at 1 and wins can't be negative.")
+
+    player_1, player_2 = player_name(player_1), player_name(player_2)
+    if player_1 == player_2:
+        raise HistoryError(f"{player_1} can't play against themselves.")
+    if player_1 == models.Player.BYE:  # like Round.create_duels, whoever has the bye is player 1
+        player_1, player_2, player_1_wins, player_2_wins = player_2, player_1, player_2_wins, player_1_wins
+    return HistoricalDuel(number, player_1, player_2, player_1_wins, player_2_wins)
+
+
+def read_csv(lines: typing.Iterable[str]) -> typing.List[HistoricalTournament]:
+    tournaments = {}
+    reader = csv.DictReader(lines)
+    missing = set(CSV_FIELDS) - set(reader.fieldnames or ())
+    if missing:
+        raise HistoryError(f"Missing the CSV columns {', '.join(sorted(missing))}.")
+
+    for row in reader:
+        try:
+            key = row["tournament"].strip(), parse_date(row["date"])
+            if key not in tournaments:
+                tournaments[key] = HistoricalTournament(*key)
+            tournaments[key].duels.append(parse_duel(*(row[field] for field in CSV_FIELDS[2:])))
+        except HistoryError as error:
+            raise HistoryError(f"Line {reader.line_num}: {error}") from error
+
+    return list(tournaments.values())
+
+
+def read_json(text: str) -> typing.List[HistoricalTournament]:
+    try:
+        rows = json.loads(text)
+    except ValueError as error:
+        raise HistoryError(f"Invalid JSON: {error}") from error
+    if not isinstance(rows, list):
+        raise HistoryError("Expected a list of tournaments.")
+
+    tournaments = []
+    for index, row in enumerate(rows):
+        try:
+            tournament = HistoricalTournament(
+                name=str(row["name"]).strip(), date=parse_date(row["date"]), finished=bool(row.get("finished", True)),
+                teams=row.get("teams") or {}, players=set(map(player_name, row.get("players", ()))),
+            )
+            for number, tournament_round in enumerate(row.get("rounds", ()), start=1):
+                tournament.duels.extend(parse_duel(
+                    tournament_round.get("number", number), duel["player_1"], duel["player_2"],
+                    duel.get("player_1_wins", 0), duel.get("player_2_wins", 0)
+                ) for duel in tournament_round["duels"])
+        except HistoryError as error:
+            raise HistoryError(f"Tournament {index + 1}: {error}") from error
+        except KeyError as error:
+            raise HistoryError(f"Tournament {index + 1}: {error} is missing.") from error
+        except (TypeError, AttributeError) as error:
+            raise HistoryError(f"Tournament {index + 1}: unexpected structure ({error}).") from error
+        tournaments.append(tournament)
+
+    return tournaments
+
+
+def _bulk_create(model: typing.Type[db_models.Model], objects: list, key: typing.Callable[[db_models.Model], tuple]):
+    """
+    Creates objects with bulk_create and sets their primary keys.
+
+    Databases that don't return them from bulk inserts get them looked up by key, which has to be unique among the
+    created rows.
+    """
+    if not objects:
+        return
+    before = model.objects.aggregate(pk=db_models.Max("pk"))["pk"] or 0
+    model.objects.bulk_create(objects)
+    if objects[0].pk is None:
+        pks = {key(created): created.pk for created in model.objects.filter(pk__gt=before)}
+        for instance in objects:
+            instance.pk = pks[key(instance)]
+
+
+def _insert(model: typing.Type[db_models.Model], rows: typing.List[tuple], fields: typing.Sequence[str]):
+    """
+    Inserts rows of the values of fields, with COPY on Postgres and executemany elsewhere.
+
+    Both skip compiling an INSERT per batch of model instances, which takes longer than the database itself.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ", ".join(connection.ops.quote_name(model._meta.get_field(field).column) for field in fields)
+    with connection.cursor() as cursor:
+        if connection.vendor != "postgresql":
+            placeholders = ", ".join(["%s"] * len(fields))
+            cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", rows)
+            return
+
+        for start in range(0, len(rows), COPY_BATCH_SIZE):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows[start:start + COPY_BATCH_SIZE])
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+@atomic
+def import_history(tournaments: typing.Iterable[HistoricalTournament]) -> Imported:
+    """Imports the tournaments with their players, rounds and duels, skipping those that exist already."""
+    with metrics.measure("import history"):
+        seen = set(models.Tournament.objects.values_list("name", "date"))
+        new, skipped = [], []
+        for tournament in tournaments:
+            (skipped if tournament.key in seen else new).append(tournament)
+            seen.add(tournament.key)
+
+        for tournament in new:
+            numbers = {duel.round for duel in tournament.duels}
+            if numbers and numbers != set(range(1, max(numbers) + 1)):
+                raise HistoryError(f"{tournament} skips a round, it has the rounds {sorted(numbers)}.")
+            paired = set()
+            for duel in tournament.duels:
+                for player in (duel.player_1, duel.player_2):
+                    if (duel.round, player) in paired:
+                        raise HistoryError(f"{player} plays twice in round {duel.round} of {tournament}.")
+                    paired.add((duel.round, player))
+
+        players = {player for tournament in new for player in tournament.all_players()}
+        if models.Player.BYE in players:
+            models.Player.bye()
+        existing_players = set(models.Player.objects.values_list("name", flat=True))
+        created_players = [models.Player(name=name) for name in sorted(players - existing_players)]
+        models.Player.objects.bulk_create(created_players)
+
+        created = [models.Tournament(name=tournament.name, date=tournament.date, finished=tournament.finished,
+                                     teams=tournament.teams) for tournament in new]
+        _bulk_create(models.Tournament, created, key=lambda tournament: (tournament.name, tournament.date))
+        _insert(models.Tournament.players.through, [
+            (tournament.pk, player) for tournament, historical in zip(created, new)
+            for player in sorted(historical.all_players())
+        ], fields=("tournament_id", "player_id"))
+
+        rounds = {(tournament.pk, number): models.Round(tournament=tournament, number=number)
+                  for tournament, historical in zip(created, new)
+                  for number in sorted({duel.round for duel in historical.duels})}
+        _bulk_create(models.Round, list(rounds.values()),
+                     key=lambda tournament_round: (tournament_round.tournament_id, tournament_round.number))
+
+        duels = [(rounds[tournament.pk, duel.round].pk, tournament.pk, duel.player_1, duel.player_2,
+                  duel.player_1_wins, duel.player_2_wins, duel.player_2 == models.Player.BYE)
+                 for tournament, historical in zip(created, new) for duel in historical.duels]
+        _insert(models.Duel, duels, fields=("round_id", "tournament_id", "player_1_id", "player_2_id",
+                                            "player_1_wins", "player_2_wins", "is_bye"))
+
+        records = models.sum_records(models.duel_records(*duel[1:6]) for duel in duels)
+        # the new tournaments have no rows yet, only the all-time rows need to be added to
+        models.PlayerStats.apply({key: record for key, record in records.items() if key[1] is None})
+        _insert(models.PlayerStats, [
+            (player, tournament, *record) for (player, tournament), record in records.items()
+            if tournament is not None and any(record)
+        ], fields=("player_id", "tournament_id", *models.PlayerStats.FIELDS))
+        models.DataVersion.bump(models.DataVersion.RESULTS, models.DataVersion.TOURNAMENTS,
+                                *map(models.DataVersion.player, players))
+
+    return Imported(tournaments=len(created), rounds=len(rounds), duels=len(duels), players=len(created_players),
+                    skipped=skipped)
@@ -0,0 +1,42 @@
+import os
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from mtg_pairings import history
+
+
+class Command(BaseCommand):
+    help = ("Imports past tournaments with their rounds and duels from CSV or JSON files, "
+            "see mtg_pairings.history for the formats. Tournaments that exist already are skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+", metavar="file")
+        parser.add_argument("--format", choices=("csv", "json"),
+                            help="Format of all files, by default it's told by their extension.")
+
+    def handle(self, *args, files=(), format=None, **options):
+        start = time.perf_counter()
+        tournaments = []
+        try:
+            for path in files:
+                file_format = format or os.path.splitext(path)[1].lstrip(".").lower()
+                if file_format not in ("csv", "json"):
+                    raise CommandError(f"Can't tell the format of {path}, use --format.")
+                with open(path, newline="", encoding="utf-8") as file:
+                    try:
+                        tournaments += (history.read_csv(file) if file_format == "csv"
+                                        else history.read_json(file.read()))
+                    except history.HistoryError as error:
+                        raise CommandError(f"{path}: {error}") from error
+
+            imported = history.import_history(tournaments)
+        except (OSError, history.HistoryError) as error:
+            raise CommandError(str(error)) from error
+
+        for tournament in imported.skipped:
+            self.stderr.write(f"Skipped {tournament}, it exists already.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported.tournaments} tournaments with {imported.rounds} rounds and {imported.duels} duels, "
+            f"{imported.players} new players, in {time.perf_counter() - start:.1f} s."
+        ))
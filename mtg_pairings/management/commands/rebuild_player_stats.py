@@ -0,0 +1,28 @@
+from django.core.management import BaseCommand, CommandError
+
+from mtg_pairings import models
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the materialized player statistics from all duels and verifies them against the live standings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify-only", action="store_true",
+                            help="Don't rebuild, only compare the statistics with the live standings.")
+
+    def handle(self, *args, verify_only=False, **options):
+        if not verify_only:
+            created = models.PlayerStats.rebuild()
+            self.stdout.write(f"Rebuilt {created} player statistics.")
+
+        mismatches = 0
+        for tournament, live, stored in models.PlayerStats.verify():
+            mismatches += 1
+            self.stderr.write(f"{live.player} in {tournament or 'all tournaments'}: "
+                              f"expected {live.match_wins}:{live.match_losses} ({live.wins}:{live.losses}), "
+                              f"stored {stored.match_wins}:{stored.match_losses} ({stored.wins}:{stored.losses})")
+
+        if mismatches:
+            raise CommandError(f"{mismatches} player statistics differ from the live standings.")
+
+        self.stdout.write(self.style.SUCCESS("Player statistics match the live standings."))
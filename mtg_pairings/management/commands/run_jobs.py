@@ -0,0 +1,34 @@
+import datetime
+import time
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from mtg_pairings import models
+
+
+class Command(BaseCommand):
+    help = "Runs queued jobs, like pairing the next round of a tournament. New jobs are polled from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Exit when no job is queued instead of waiting for new ones.")
+        parser.add_argument("--interval", type=float, default=1.0,
+                            help="Seconds to wait before polling again when no job is queued.")
+        parser.add_argument("--stale-after", type=float, default=600.0,
+                            help="Seconds after which a running job is considered lost and queued again.")
+
+    def handle(self, *args, once=False, interval=1.0, stale_after=600.0, **options):
+        stale_after = datetime.timedelta(seconds=stale_after)
+        while True:
+            close_old_connections()
+            job = models.Job.claim(stale_after)
+            if job is None:
+                if once:
+                    return
+                time.sleep(interval)
+                continue
+
+            job.run()
+            style = self.style.ERROR if job.state == models.Job.FAILED else self.style.SUCCESS
+            self.stdout.write(style(str(job)))
@@ -0,0 +1,220 @@
+"""
+Wall time, SQL query count and SQL time of views and hot functions.
+
+The middleware measures every view, instrument() measures functions. Samples are aggregated into
+histograms per process, exposed in the Prometheus text format by the metrics view, and attached to the
+Sentry scope. Set METRICS_ENABLED to False to turn all of it off.
+
+A server runs several worker processes and any of them may answer a scrape. With METRICS_DIR set, which
+config/gunicorn.py does, every process writes its histograms to a file there at most FLUSH_SECONDS after
+recording a sample, and the metrics view adds up the files of all processes. The files of workers that exited
+are kept, so the counts only go up until the directory is cleared when the server starts.
+"""
+import bisect
+import contextlib
+import functools
+import json
+import os
+import pathlib
+import threading
+import time
+import typing
+import uuid
+
+import sentry_sdk
+from django.conf import settings
+from django.db import connection
+
+FLUSH_SECONDS = 1.0
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+
+class Histogram:
+    """Cumulative counts of observations per upper bucket bound, like Prometheus histograms."""
+
+    def __init__(self, buckets: typing.Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def merge(self, counts: typing.Sequence[int], total: float):
+        """Adds the counts and sum of a histogram with the same buckets."""
+        self.counts = [count + other for count, other in zip(self.counts, counts)]
+        self.sum += total
+
+    def cumulative(self) -> typing.Iterator[typing.Tuple[str, int]]:
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield ("+Inf" if bound == float("inf") else repr(bound)), total
+
+
+class Sample:
+    """The measurement of one call, the execute wrapper adds up the queries running during it."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+# name -> histogram for every metric, guarded by _lock
+HISTOGRAMS = {
+    "seconds": ("Wall time of views and hot functions.", SECONDS_BUCKETS, {}),
+    "queries": ("SQL queries of views and hot functions.", QUERIES_BUCKETS, {}),
+    "sql_seconds": ("Time spent in SQL queries of views and hot functions.", SECONDS_BUCKETS, {}),
+}
+_lock = threading.Lock()
+_flush_timer: typing.Optional[threading.Timer] = None  # pending flush(), guarded by _lock
+_process = (None, None)  # (pid, file name) of this process, forked workers get a name of their own
+
+
+def record(sample: Sample):
+    global _flush_timer
+    with _lock:
+        for metric, (_, buckets, histograms) in HISTOGRAMS.items():
+            if sample.name not in histograms:
+                histograms[sample.name] = Histogram(buckets)
+            histograms[sample.name].observe(getattr(sample, metric))
+
+        if settings.METRICS_DIR and _flush_timer is None:
+            _flush_timer = threading.Timer(FLUSH_SECONDS, flush)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+    with sentry_sdk.configure_scope() as scope:
+        scope.set_context(f"metrics {sample.name}", {
+            "seconds": sample.seconds, "queries": sample.queries, "sql_seconds": sample.sql_seconds
+        })
+
+
+@contextlib.contextmanager
+def measure(name: str):
+    """Measures the block as name, the yielded sample may be renamed before the block ends."""
+    if not settings.METRICS_ENABLED:
+        yield None
+        return
+
+    sample = Sample(name)
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(sample):
+            yield sample
+    finally:
+        sample.seconds = time.perf_counter() - start
+        record(sample)
+
+
+def instrument(function=None, *, name: str = None):
+    """Decorator that measures every call of function under name, its qualified name by default."""
+    if function is None:
+        return functools.partial(instrument, name=name)
+
+    name = name or function.__qualname__
+
+    @functools.wraps(function)
+    def instrumented(*args, **kwargs):
+        if not settings.METRICS_ENABLED:
+            return function(*args, **kwargs)
+
+        with measure(name):
+            return function(*args, **kwargs)
+
+    return instrumented
+
+
+class MetricsMiddleware:
+    """Measures every request under the name of the view that handled it."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with measure("view") as sample:
+            response = self.get_response(request)
+            if sample is not None:
+                match = request.resolver_match
+                sample.name = f"view {match.view_name if match is not None else 'unresolved'}"
+
+        return response
+
+
+def _process_file() -> pathlib.Path:
+    global _process
+    pid, name = _process
+    if pid != os.getpid():  # the name isn't only the pid, a later worker may get the pid of one that exited
+        _process = pid, name = os.getpid(), f"{os.getpid()}-{uuid.uuid4().hex}.json"
+    return pathlib.Path(settings.METRICS_DIR) / name
+
+
+def flush():
+    """Writes the histograms of this process to its file in METRICS_DIR."""
+    global _flush_timer
+    if not settings.METRICS_DIR:
+        return
+
+    with _lock:
+        _flush_timer = None
+        state = {metric: {name: [list(histogram.counts), histogram.sum] for name, histogram in histograms.items()}
+                 for metric, (_, _, histograms) in HISTOGRAMS.items()}
+    path = _process_file()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(state))
+    os.replace(str(temporary), str(path))  # scrapes never read a half written file
+
+
+def _all_processes() -> typing.Dict[str, typing.Dict[str, Histogram]]:
+    """The histograms of all processes that wrote to METRICS_DIR added up, including this one."""
+    flush()
+    total = {metric: {} for metric in HISTOGRAMS}
+    for path in pathlib.Path(settings.METRICS_DIR).glob("*.json"):
+        for metric, histograms in json.loads(path.read_text()).items():
+            if metric not in HISTOGRAMS:
+                continue  # written by another version of the code
+            buckets = HISTOGRAMS[metric][1]
+            for name, (counts, histogram_sum) in histograms.items():
+                if len(counts) == len(buckets) + 1:
+                    total[metric].setdefault(name, Histogram(buckets)).merge(counts, histogram_sum)
+    return total
+
+
+def exposition() -> str:
+    """All histograms in the Prometheus text format, of all processes if METRICS_DIR is set."""
+    if settings.METRICS_DIR:
+        all_histograms = _all_processes()
+    else:
+        with _lock:
+            all_histograms = {metric: dict(histograms) for metric, (_, _, histograms) in HISTOGRAMS.items()}
+
+    lines = []
+    with _lock:
+        for metric, (help_text, _, _) in HISTOGRAMS.items():
+            full_name = f"mtg_pairings_{metric}"
+            lines += [f"# HELP {full_name} {help_text}", f"# TYPE {full_name} histogram"]
+            for name, histogram in sorted(all_histograms[metric].items()):
+                label = name.replace("\\", "\\\\").replace('"', '\\"')
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{full_name}_bucket{{name="{label}",le="{bound}"}} {count}')
+                lines.append(f'{full_name}_sum{{name="{label}"}} {histogram.sum!r}')
+                lines.append(f'{full_name}_count{{name="{label}"}} {histogram.count}')
+
+    return "\n".join(lines) + "\n"
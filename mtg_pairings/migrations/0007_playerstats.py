@@ -0,0 +1,68 @@
+# Generated by Django 2.0.13 on 2026-10-17 03:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+FREEWIN = "FREE WIN"
+
+
+def build_player_stats(apps, schema_editor):
+    Duel = apps.get_model('mtg_pairings', 'Duel')
+    PlayerStats = apps.get_model('mtg_pairings', 'PlayerStats')
+
+    records = {}
+    duels = Duel.objects.values_list('round__tournament', 'player_1', 'player_2', 'player_1_wins', 'player_2_wins')
+    for tournament, player_1, player_2, player_1_wins, player_2_wins in duels:
+        player_1_won, player_2_won = int(player_1_wins > player_2_wins), int(player_2_wins > player_1_wins)
+        results = {
+            player_1: (player_1_won, player_2_won, player_1_wins, player_2_wins),
+            player_2: (player_2_won, player_1_won, player_2_wins, player_1_wins),
+        }
+        is_freewin = FREEWIN in results
+        results.pop(FREEWIN, None)
+        for player, result in results.items():
+            for key in [(player, tournament)] + ([] if is_freewin else [(player, None)]):
+                records[key] = [total + value for total, value in zip(records.get(key, (0, 0, 0, 0)), result)]
+
+    PlayerStats.objects.bulk_create(
+        PlayerStats(player_id=player, tournament_id=tournament, match_wins=match_wins, match_losses=match_losses,
+                    wins=wins, losses=losses)
+        for (player, tournament), (match_wins, match_losses, wins, losses) in records.items()
+        if match_wins or match_losses or wins or losses
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtg_pairings', '0006_auto_20190521_1142'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('match_wins', models.PositiveIntegerField(default=0)),
+                ('match_losses', models.PositiveIntegerField(default=0)),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('losses', models.PositiveIntegerField(default=0)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='mtg_pairings.Player')),
+                ('tournament', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='player_stats', to='mtg_pairings.Tournament')),
+            ],
+            options={
+                'verbose_name_plural': 'player stats',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='playerstats',
+            unique_together={('tournament', 'player')},
+        ),
+        # unique_together does not cover the all-time rows, NULLs never collide.
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX mtg_pairings_playerstats_all_time_uniq '
+            'ON mtg_pairings_playerstats (player_id) WHERE tournament_id IS NULL',
+            'DROP INDEX mtg_pairings_playerstats_all_time_uniq',
+        ),
+        migrations.RunPython(build_player_stats, migrations.RunPython.noop),
+    ]
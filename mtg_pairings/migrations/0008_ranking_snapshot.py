@@ -0,0 +1,33 @@
+# Generated by Django 2.0.13 on 2026-10-17 03:20
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtg_pairings', '0007_playerstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('value', models.PositiveIntegerField(default=0)),
+                ('modified', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RankingSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_duel_id', models.PositiveIntegerField(default=0)),
+                ('results_version', models.PositiveIntegerField(default=0)),
+                ('player_count', models.PositiveIntegerField(default=0)),
+                ('scores', django.contrib.postgres.fields.jsonb.JSONField(default=dict)),
+                ('calculated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
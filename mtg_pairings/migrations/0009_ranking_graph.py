@@ -0,0 +1,27 @@
+# Generated by Django 2.0.13 on 2026-10-17 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtg_pairings', '0008_ranking_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingGraph',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('image', models.BinaryField()),
+                ('max_duel_id', models.PositiveIntegerField()),
+                ('results_version', models.PositiveIntegerField()),
+                ('player_count', models.PositiveIntegerField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ('-created',),
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.0.13 on 2026-10-17 04:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def set_duel_tournaments(apps, schema_editor):
+    Duel = apps.get_model('mtg_pairings', 'Duel')
+    Round = apps.get_model('mtg_pairings', 'Round')
+
+    Duel.objects.update(
+        tournament=models.Subquery(Round.objects.filter(pk=models.OuterRef('round')).values('tournament')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtg_pairings', '0009_ranking_graph'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='duel',
+            name='tournament',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mtg_pairings.Tournament'),
+        ),
+        migrations.RunPython(set_duel_tournaments, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='duel',
+            name='tournament',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mtg_pairings.Tournament'),
+        ),
+        migrations.AddIndex(
+            model_name='duel',
+            index=models.Index(fields=['tournament', 'player_1'], name='duel_tournament_player_1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='duel',
+            index=models.Index(fields=['tournament', 'player_2'], name='duel_tournament_player_2_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.0.13 on 2026-10-17 04:31
+
+from django.db import migrations, models
+
+BYE = "FREE WIN"
+
+
+def flag_byes(apps, schema_editor):
+    Player = apps.get_model('mtg_pairings', 'Player')
+    Duel = apps.get_model('mtg_pairings', 'Duel')
+
+    Player.objects.filter(name=BYE).update(is_bye=True)
+    Duel.objects.filter(models.Q(player_1=BYE) | models.Q(player_2=BYE)).update(is_bye=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtg_pairings', '0010_duel_tournament'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='duel',
+            name='is_bye',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='is_bye',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(flag_byes, migrations.RunPython.noop),
+        # there is only one bye player
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX mtg_pairings_player_bye_uniq ON mtg_pairings_player (is_bye) WHERE is_bye',
+            'DROP INDEX mtg_pairings_player_bye_uniq',
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.0.13 on 2026-10-17 03:55
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtg_pairings', '0012_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TournamentEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('round', 'Round'), ('results', 'Results'), ('standing', 'Standing'), ('finished', 'Finished')], max_length=16)),
+                ('data', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('tournament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='mtg_pairings.Tournament')),
+            ],
+            options={
+                'ordering': ('pk',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='tournamentevent',
+            index=models.Index(fields=['tournament', 'id'], name='event_tournament_id_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.0.13 on 2026-10-17 04:23
+
+from django.db import migrations, models
+
+
+def rank_players(apps, schema_editor):
+    """Copies the scores of the current ranking, otherwise they're only written once the duels change."""
+    snapshot = apps.get_model('mtg_pairings', 'RankingSnapshot').objects.first()
+    if snapshot is None:
+        return
+    for stats in apps.get_model('mtg_pairings', 'PlayerStats').objects.filter(tournament=None):
+        stats.pagerank = snapshot.scores.get(stats.player_id)
+        stats.save(update_fields=['pagerank'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtg_pairings', '0013_tournament_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playerstats',
+            name='pagerank',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='playerstats',
+            index=models.Index(fields=['tournament', '-pagerank', 'player'], name='playerstats_pagerank_idx'),
+        ),
+        migrations.RunPython(rank_players, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.0.13 on 2026-10-17 04:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtg_pairings', '0014_playerstats_pagerank'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('next_round', 'Next round'), ('ranking_graph', 'Ranking graph')], max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='round_number',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='tournament',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='mtg_pairings.Tournament'),
+        ),
+    ]
@@ -1,28 +1,41 @@
-import base64
-import bisect
 import collections
 import datetime
-import itertools
+import hashlib
+import importlib
+import logging
+import operator
+import traceback
 import typing
 from typing import List
 
 import attr
-import networkx.algorithms.matching
 from django.apps import apps
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.postgres.fields import JSONField
 from django.core.exceptions import ValidationError
-from django.db import models, IntegrityError
+from django.db import connection, models, transaction, IntegrityError
 from django.db.transaction import atomic
 from django.dispatch import receiver
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.contrib.auth.models import User, Group
 
+from mtg_pairings import metrics
+
+# numpy and networkx are only imported once something is calculated, see mtg_pairings.engine
+engine = SimpleLazyObject(lambda: importlib.import_module("mtg_pairings.engine"))
+
 
 class Player(models.Model):
     name = models.CharField(max_length=256, primary_key=True)
     user = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True)
-    _FREEWIN: "Player" = None
+    # the player that stands in for byes, see BYE
+    is_bye = models.BooleanField(default=False, editable=False)
+
+    BYE = "FREE WIN"  # name and primary key of the bye player
+    ALL_TIME_CACHE_KEY = "players:all-time"
 
     class Meta:
         ordering = ("name", )
@@ -31,15 +44,18 @@ class Player(models.Model):
         return self.name
 
     @classmethod
-    def FREEWIN(cls) -> "Player":
-        if cls._FREEWIN is None:
-            cls._FREEWIN, created = cls.objects.get_or_create(name="FREE WIN")
+    def bye(cls) -> "Player":
+        player, created = cls.objects.get_or_create(name=cls.BYE, defaults={"is_bye": True})
+        return player
 
-        return cls._FREEWIN
+    @staticmethod
+    def normalize_name(name: str) -> str:
+        """Names are title cased with single spaces, see capitalize_player_names."""
+        return " ".join(name.strip().title().split())
 
     @classmethod
     def without_freewin(cls):
-        return cls.objects.exclude(name=cls.FREEWIN().name)
+        return cls.objects.filter(is_bye=False)
 
     def get_absolute_url(self):
         return reverse('player_detail', args=[self.name])
@@ -56,49 +72,115 @@ class Player(models.Model):
             | models.Q(player_1=opponent, player_2=self)
         )
 
+    def profile(self) -> 'PlayerProfile':
+        """
+        The player's records and duels, cached until one of the player's duels changes.
+
+        The entry is stamped with the player's version, so a new profile replaces the stale one.
+        """
+        version = DataVersion.player(self.pk)
+        key = f"player-profile:{version}"
+        current_version = DataVersion.get(version)
+        cached = cache.get(key)
+        if cached is not None and cached[0] == current_version:
+            return cached[1]
+
+        profile = PlayerProfile.of(self)
+        cache.set(key, (current_version, profile), timeout=None)
+        return profile
+
     @property
     def all_time_performance(self) -> 'Performance':
-        duels = self.duels(Duel.without_freewins())
+        stats = self.stats.filter(tournament=None).first()
+        if stats is None:
+            return Performance(self, 0, 0, 0, 0)
 
-        returned_standing = standing(duels, [self])
-        assert len(returned_standing) == 1, f"Standing contains more players than {self}"
-
-        return returned_standing[0]
+        return Performance(self, *stats.record)
 
     @classmethod
     def all_time_standing(cls, duels=None, players=None):
+        if duels is None and players is None:
+            all_stats = list(PlayerStats.all_time().select_related("player").order_by("player"))
+            records = zip(*(stats.record for stats in all_stats)) if all_stats else ((), (), (), ())
+            return sort_standing(engine.batch_performances([stats.player for stats in all_stats], *records))
+
         if duels is None:
             duels = Duel.without_freewins().select_related("round__tournament__players")
 
         if players is None:
-            players = duels.values_list("player_1", flat=True).union(duels.values_list("player_2", flat=True))
-            players = Player.objects.filter(name__in=players)
+            players = cls.playing(duels)
 
         return standing(duels, players)
 
     @classmethod
-    def all_time_ranking(cls, draw=False):
-        duels = Duel.without_freewins().select_related("round__tournament__players")
+    def playing(cls, duels=None):
+        """Players that took part in any of duels, all duels without free wins by default."""
+        if duels is None:
+            duels = Duel.without_freewins()
 
         players = duels.values_list("player_1", flat=True).union(duels.values_list("player_2", flat=True))
-        players = Player.objects.filter(name__in=players)
+        return cls.objects.filter(name__in=players)
 
-        calculated_standing = cls.all_time_standing(duels=duels, players=players)
-        pageranking, visualization = ranking(duels, players, draw=draw)
+    @classmethod
+    def all_time_ranking(cls, draw=False, calculated_standing: List['Performance'] = None):
+        """
+        The all-time standing ordered by PageRank, pass calculated_standing if it's at hand already.
+
+        With draw the graph of the current ranking is included. If it has not been drawn yet,
+        a job of the run_jobs worker draws it and graph is None until it's done.
+        """
+        if calculated_standing is None:
+            calculated_standing = cls.all_time_standing()
+        pageranking = RankingSnapshot.current()
 
         return {
             "ranking": sorted(calculated_standing, key=lambda k: pageranking[k.player], reverse=True),
-            "graph": visualization
+            "graph": RankingGraph.current() if draw else None
         }
 
+    @classmethod
+    def cached_all_time(cls) -> dict:
+        """
+        The all-time standing and ranking (without the graph) from the cache, recalculated once results changed.
+
+        Entries are stamped with the results version. While one worker recalculates a stale entry,
+        the others keep serving it.
+        """
+        version = DataVersion.get(DataVersion.RESULTS)
+        cached = cache.get(cls.ALL_TIME_CACHE_KEY)
+        if cached is not None:
+            cached_version, all_time = cached
+            if cached_version == version or not cache.add(f"{cls.ALL_TIME_CACHE_KEY}:lock", True, timeout=60):
+                return all_time
 
-@attr.s(cmp=False)
+        try:
+            calculated_standing = cls.all_time_standing()
+            all_time = {"standing": calculated_standing,
+                        "ranking": cls.all_time_ranking(calculated_standing=calculated_standing)["ranking"]}
+            cache.set(cls.ALL_TIME_CACHE_KEY, (version, all_time), timeout=None)
+        finally:
+            if cached is not None:
+                cache.delete(f"{cls.ALL_TIME_CACHE_KEY}:lock")
+
+        return all_time
+
+
+@attr.s(cmp=False, slots=True)
 class Performance:
     player: Player = attr.ib()
     match_wins: int = attr.ib()
     match_losses: int = attr.ib()
     wins: int = attr.ib()
     losses: int = attr.ib()
+    # tiebreakers, see engine.add_tiebreakers()
+    opponent_match_win_percentage: float = attr.ib(default=0.0)
+    opponent_win_percentage: float = attr.ib(default=0.0)
+    # float(self), calculated once when the record is created, so don't change the record afterwards
+    score: float = attr.ib(default=None, repr=False)
+
+    def __attrs_post_init__(self):
+        if self.score is None:
+            self.score = self.match_win_percentage * 100 + self.win_percentage
 
     @attr.s
     class PerformanceDiff:
@@ -129,7 +211,7 @@ class Performance:
             return 0.0
 
     def __float__(self):
-        return self.match_win_percentage * 100 + self.win_percentage
+        return self.score
 
     def __add__(self, other):
         if isinstance(other, self.__class__):
@@ -161,6 +243,36 @@ class Performance:
         return float(self) == float(other)
 
 
+@attr.s(frozen=True)
+class PlayerProfile:
+    performance: Performance = attr.ib()
+    # the player's performance against each of their opponents
+    head_to_head: typing.Dict[Player, Performance] = attr.ib()
+    tournaments: typing.Dict['Tournament', List[dict]] = attr.ib()
+
+    @classmethod
+    def of(cls, player: Player) -> 'PlayerProfile':
+        """Builds the profile from a single query over the player's duels."""
+        duels = player.duels().select_related("player_1", "player_2", "tournament").order_by(
+            "-tournament__date", "tournament", "round__number"
+        )
+        performance = Performance(player, 0, 0, 0, 0)
+        head_to_head = {}
+        tournaments = collections.defaultdict(list)
+        for duel in duels:
+            opponent, wins, losses = duel.opponent(player), duel.wins_of(player), duel.losses_of(player)
+            tournaments[duel.tournament].append({"opponent": opponent, "wins": wins, "losses": losses})
+            if duel.is_bye:  # free wins don't count for all-time records
+                continue
+
+            duel_performance = Performance(player, int(wins > losses), int(losses > wins), wins, losses)
+            performance += duel_performance
+            head_to_head[opponent] = head_to_head.get(opponent, Performance(player, 0, 0, 0, 0)) + duel_performance
+
+        head_to_head = dict(sorted(head_to_head.items(), key=lambda item: item[0].name))
+        return cls(performance, head_to_head, dict(tournaments))
+
+
 class Tournament(models.Model):
     name = models.CharField(max_length=256)
     players = models.ManyToManyField(Player, related_name='tournaments')
@@ -178,16 +290,44 @@ class Tournament(models.Model):
         if player is not None:
             return self.duels().filter(models.Q(player_1=player) | models.Q(player_2=player))
 
-        return Duel.objects.filter(round__tournament=self).distinct()
+        return Duel.objects.filter(tournament=self)
+
+    @classmethod
+    def with_rounds(cls):
+        """
+        Tournaments with their players, rounds, duels and the duels' players loaded in four queries.
+
+        pairing is annotated, whether a job pairs their next round right now, and last_event, the primary key of
+        their latest TournamentEvent that live pages continue from.
+        """
+        return cls.objects.annotate(
+            pairing=models.Exists(Job.pending().filter(tournament=models.OuterRef("pk"))),
+            last_event=models.Subquery(TournamentEvent.objects.filter(
+                tournament=models.OuterRef("pk")).order_by("-pk").values("pk")[:1]),
+        ).prefetch_related(
+            "players",
+            models.Prefetch("rounds", queryset=Round.objects.order_by("number").prefetch_related(
+                models.Prefetch("duels", queryset=Duel.objects.select_related("player_1", "player_2"))
+            )),
+        )
 
     @property
     def standing(self) -> List[Performance]:
-        players = self.players.exclude(name=Player.FREEWIN())
-
-        if not self.rounds.exists():
-            return [Performance(player, 0, 0, 0, 0) for player in players]
+        prefetched = getattr(self, "_prefetched_objects_cache", {})
+        if "players" in prefetched and "rounds" in prefetched:  # see with_rounds()
+            return engine.results_standing(
+                ((duel.player_1_id, duel.player_2_id, duel.player_1_wins, duel.player_2_wins)
+                 for tournament_round in self.rounds.all() for duel in tournament_round.duels.all()),
+                [player for player in self.players.all() if not player.is_bye]
+            )
 
-        return standing(self.duels(), players=players)
+        performances = self.performances()
+        player_index = {performance.player.pk: index for index, performance in enumerate(performances)}
+        player_1, player_2, *_ = engine.result_columns(
+            self.duels().filter(is_bye=False).values_list("player_1", "player_2", "player_1_wins", "player_2_wins"),
+            player_index
+        )
+        return sort_standing(engine.add_tiebreakers(performances, player_1, player_2))
 
     @property
     def current_round(self) -> 'Round':
@@ -201,125 +341,149 @@ class Tournament(models.Model):
             ), flat=True
         )
 
+    @metrics.instrument
     @atomic
-    def start_first_round(self) -> 'Round':
-        freewin = Player.FREEWIN()
-        all_players = set(self.players.all())
+    def start_first_round(self, exact: bool = None) -> 'Round':
+        """
+        Creates and returns the first round, pairing players with a similar all-time ranking.
 
-        player_ranking, _ = ranking(duels=Duel.without_freewins(), players=Player.without_freewin())
-        next_round = Round.objects.create(tournament=self, number=1)
-        if freewin in all_players:
-            last_player = min([p for p in player_ranking if p in all_players], key=player_ranking.__getitem__)
-            Duel.objects.create(
-                round=next_round, player_1=last_player, player_2=freewin, player_1_wins=settings.MATCH_WINS_NEEDED
-            )
-            all_players -= {freewin, last_player}  # don't count free wins
+        exact defaults to settings.EXACT_FIRST_ROUND_MATCHING, see engine.ranking_pairing.
+        """
+        if exact is None:
+            exact = settings.EXACT_FIRST_ROUND_MATCHING
 
-        graph = networkx.Graph()
+        all_players = set(self.players.all())
 
-        graph.add_weighted_edges_from(
-            (player, opponent, penalty(player_ranking[player], player_ranking[opponent]))
-            for player, opponent in itertools.combinations(all_players, r=2)
-        )
+        player_ranking = engine.rankings_of(all_players, RankingSnapshot.current())
+        matching = []
+        bye = next((player for player in all_players if player.is_bye), None)
+        if bye is not None:
+            last_player = min(all_players - {bye}, key=lambda player: (player_ranking[player], player.name))
+            matching.append((last_player, bye))
+            all_players -= {bye, last_player}  # don't count free wins
 
-        matching = networkx.algorithms.matching.max_weight_matching(graph, maxcardinality=True)
+        matching += engine.ranking_pairing(all_players, player_ranking, exact=exact)
 
-        not_matched_players = all_players
+        not_matched_players = set(all_players)
         for player_1, player_2 in matching:
-            Duel.objects.create(round=next_round, player_1=player_1, player_2=player_2)
             not_matched_players -= {player_1, player_2}
 
         assert not not_matched_players, f"Something went wrong when matching up, {not_matched_players} where not matched up."
 
+        next_round = Round.objects.create(tournament=self, number=1)
+        next_round.create_duels(matching)
+
         return next_round
 
+    @metrics.instrument
     @atomic
     def start_next_round(self) -> 'Round':
-        """Creates and returns the objects for the next round."""
-        freewin = Player.FREEWIN()
-        last_round = self.current_round
-        all_players = set(self.players.all())
-        all_possible_matchings = set(map(frozenset, itertools.combinations(all_players, r=2)))
-        previous_duels = self.duels()
-        previous_matchings = set(
-            frozenset((duel.player_1, duel.player_2))
-            for duel in previous_duels
-        )
-
-        possible_matchings = all_possible_matchings - previous_matchings
-        assert possible_matchings
-
-        next_round = Round.objects.create(tournament=self, number=last_round.number + 1)
-
-        current_standing = sorted(self.standing, key=lambda p: (p, last_round.get_duel_for_player(p.player).wins_of(p.player)), reverse=True)
-        players_to_match = [p.player for p in current_standing] + [freewin] if freewin in all_players else []
-        matched_players = set()
-
-        while len(players_to_match) > 1:
-            player = players_to_match.pop(0)
-            for opponent in players_to_match:
-                match = frozenset((player, opponent))
-                if match in possible_matchings:
-                    matched_players.add(match)
-                    players_to_match.remove(opponent)
-                    break
-            else:
-                raise AssertionError(f"No opponent found for {player}")
-
-        assert not players_to_match, f'{players_to_match} have not been matched'
-
-        for player_1, player_2 in matched_players:
-            assert player_2 not in self.opponents(player_1)
-            assert player_1 not in self.opponents(player_2)
-            if freewin == player_1:
-                player_1, player_2 = player_2, player_1
-                player_1_wins = settings.MATCH_WINS_NEEDED
-            elif freewin == player_2:
-                player_1_wins = settings.MATCH_WINS_NEEDED
-            else:
-                player_1_wins = 0
-            Duel.objects.create(player_1=player_1, player_2=player_2, player_1_wins=player_1_wins, round=next_round)
+        """
+        Creates and returns the objects for the next round.
+
+        Raises PairingError if the players can't be paired without a rematch.
+        """
+        duels = list(self.duels().values_list("round__number", "player_1", "player_2", "player_1_wins",
+                                              "player_2_wins"))
+        last_round_number = max((number for number, *_ in duels), default=0)
+        last_round_wins = {}
+        for number, player_1, player_2, player_1_wins, player_2_wins in duels:
+            if number == last_round_number:
+                last_round_wins[player_1], last_round_wins[player_2] = player_1_wins, player_2_wins
+
+        current_standing = engine.results_standing(((player_1, player_2, player_1_wins, player_2_wins)
+                                                    for _, player_1, player_2, player_1_wins, player_2_wins in duels),
+                                                   self.players.filter(is_bye=False))
+        current_standing.sort(key=lambda p: (standing_key(p), last_round_wins.get(p.player.pk, 0)), reverse=True)
+        players = [p.player for p in current_standing]
+        groups = [p.match_wins for p in current_standing]  # the score groups, see engine.swiss_pairing
+        bye = self.players.filter(is_bye=True).first()
+        if bye is not None:
+            players.append(bye)  # the free win goes to the lowest ranked player who didn't have one yet
+            groups.append(groups[-1])
+
+        index = {player.pk: position for position, player in enumerate(players)}
+        opponents = [0] * len(players)
+        for _, player_1, player_2, *_ in duels:
+            if player_1 in index and player_2 in index:
+                opponents[index[player_1]] |= 1 << index[player_2]
+                opponents[index[player_2]] |= 1 << index[player_1]
+
+        pairing = engine.swiss_pairing(opponents, groups)
+        if pairing is None:
+            raise PairingError(f"The players of {self} can't be paired without a rematch.")
+
+        previous_pairings = {frozenset((player_1, player_2)) for _, player_1, player_2, *_ in duels}
+        matching = [(players[player_1], players[player_2]) for player_1, player_2 in pairing]
+        assert not any(frozenset((player_1.pk, player_2.pk)) in previous_pairings for player_1, player_2 in matching)
+
+        next_round = Round.objects.create(tournament=self, number=last_round_number + 1)
+        next_round.create_duels(matching)
 
         return next_round
 
     def finish(self):
         self.finished = True
         self.save()
+        TournamentEvent.objects.create(tournament=self, kind=TournamentEvent.FINISHED, data={})
+
+    PERFORMANCES_SQL = """
+        SELECT player.*,
+               COALESCE(SUM(CASE WHEN duel.wins > duel.losses THEN 1 ELSE 0 END), 0) AS match_wins,
+               COALESCE(SUM(CASE WHEN duel.wins < duel.losses THEN 1 ELSE 0 END), 0) AS match_losses,
+               COALESCE(SUM(duel.wins), 0) AS wins,
+               COALESCE(SUM(duel.losses), 0) AS losses
+        FROM mtg_pairings_player player
+        INNER JOIN mtg_pairings_tournament_players participant
+            ON participant.player_id = player.name AND participant.tournament_id = %s
+        LEFT JOIN (
+            SELECT player_1_id AS player, player_1_wins AS wins, player_2_wins AS losses
+            FROM mtg_pairings_duel WHERE tournament_id = %s
+            UNION ALL
+            SELECT player_2_id AS player, player_2_wins AS wins, player_1_wins AS losses
+            FROM mtg_pairings_duel WHERE tournament_id = %s
+        ) duel ON duel.player = player.name
+        WHERE NOT player.is_bye {condition}
+        GROUP BY player.name, player.user_id, player.is_bye
+        ORDER BY player.name
+    """
 
-    def wins(self, player: Player) -> int:
-        aggregate = self.duels(player).aggregate(wins=models.Sum(
-            models.Case(models.When(player_1=player, then='player_1_wins'),
-                        models.When(player_2=player, then='player_2_wins'))))
+    def performances(self, player: Player = None) -> List[Performance]:
+        """
+        The performances of all players but the bye player from one grouped query over the duels.
 
-        return aggregate['wins'] if aggregate['wins'] else 0
+        Free wins count for the player who got them. With player only their performance is returned.
+        """
+        params = [self.pk, self.pk, self.pk]
+        condition = ""
+        if player is not None:
+            params.append(player.pk)
+            condition = "AND player.name = %s"
 
-    def losses(self, player: Player) -> int:
-        aggregate = self.duels(player).aggregate(losses=models.Sum(
-            models.Case(models.When(player_1=player, then='player_2_wins'),
-                        models.When(player_2=player, then='player_1_wins'))))
-        return aggregate['losses'] if aggregate['losses'] else 0
+        return [
+            Performance(player, player.match_wins, player.match_losses, player.wins, player.losses)
+            for player in Player.objects.raw(self.PERFORMANCES_SQL.format(condition=condition), params)
+        ]
 
-    def _match_win_query(self, player: Player):
-        won_as_player_1 = models.Q(player_1=player, player_1_wins__gt=models.F('player_2_wins'))
-        won_as_player_2 = models.Q(player_2=player, player_2_wins__gt=models.F('player_1_wins'))
-        return won_as_player_1 | won_as_player_2
+    def wins(self, player: Player) -> int:
+        return self.performance(player).wins
 
-    def _match_lose_query(self, player: Player):
-        lost_as_player_1 = models.Q(player_1=player, player_1_wins__lt=models.F('player_2_wins'))
-        lost_as_player_2 = models.Q(player_2=player, player_2_wins__lt=models.F('player_1_wins'))
-        return lost_as_player_1 | lost_as_player_2
+    def losses(self, player: Player) -> int:
+        return self.performance(player).losses
 
     def match_wins(self, player: Player) -> int:
-        return self.duels(player).filter(self._match_win_query(player)).count()
+        return self.performance(player).match_wins
 
     def match_losses(self, player: Player) -> int:
-        return self.duels(player).filter(self._match_lose_query(player)).count()
+        return self.performance(player).match_losses
+
+    def performance(self, player: Player) -> Performance:
+        """The player's line of performances(), zeros if they didn't play."""
+        performances = self.performances(player)
+        if not performances:
+            return Performance(player, 0, 0, 0, 0)
 
-    def performance(self, player: Player):
-        return Performance(player,
-                           match_wins=self.match_wins(player), wins=self.wins(player),
-                           match_losses=self.match_losses(player), losses=self.losses(player)
-                           )
+        return performances[0]
 
     def get_absolute_url(self):
         return reverse('tournament_detail', args=[str(self.id)])
@@ -335,6 +499,40 @@ class Round(models.Model):
     def __str__(self):
         return f'Round {self.number} of {self.tournament}'
 
+    def create_duels(self, pairs: typing.Iterable[typing.Tuple[Player, Player]]) -> List['Duel']:
+        """
+        Creates the duels of this round with a single INSERT, and reads them back if the database doesn't return
+        their primary keys.
+
+        Whoever is paired with the bye player becomes player 1 and wins right away.
+        Like Duel.save this updates PlayerStats and the results version and emits the pairings, bulk_create
+        doesn't call it.
+        """
+        duels = []
+        for player_1, player_2 in pairs:
+            if player_1.is_bye:
+                player_1, player_2 = player_2, player_1
+            player_1_wins = settings.MATCH_WINS_NEEDED if player_2.is_bye else 0
+            duels.append(Duel(round=self, tournament_id=self.tournament_id, player_1=player_1, player_2=player_2,
+                              player_1_wins=player_1_wins, is_bye=player_2.is_bye))
+
+        Duel.objects.bulk_create(duels)
+        if duels and duels[0].pk is None:  # only some databases return the primary keys of bulk created rows
+            duels = list(self.duels.all())  # the round is new, so these are the duels that were just created
+        for duel in duels:
+            duel._saved_result = duel._result()
+
+        PlayerStats.apply(sum_records(
+            duel_records(self.tournament_id, duel.player_1_id, duel.player_2_id, duel.player_1_wins,
+                         duel.player_2_wins)
+            for duel in duels
+        ))
+        DataVersion.bump(DataVersion.RESULTS, DataVersion.tournament(self.tournament_id), *(
+            DataVersion.player(player) for duel in duels for player in (duel.player_1_id, duel.player_2_id)
+        ))
+        TournamentEvent.round_created(self, duels)
+        return duels
+
     def get_duel_for_player(self, player: Player) -> 'Duel':
         return self.duels.get(models.Q(player_1=player) | models.Q(player_2=player))
 
@@ -352,19 +550,107 @@ class Duel(models.Model):
     player_1 = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='player_ones')
     player_2 = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='player_twos')
     round = models.ForeignKey(Round, on_delete=models.CASCADE, related_name='duels')
+    # the round's tournament, so per tournament queries don't need to join rounds. The indexes in Meta start
+    # with it, so it needs none of its own.
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='+', db_index=False)
 
     player_1_wins = models.PositiveSmallIntegerField(default=0)
     player_2_wins = models.PositiveSmallIntegerField(default=0)
+    # one of the players is the bye player
+    is_bye = models.BooleanField(default=False, editable=False)
+
+    RESULT_FIELDS = ("tournament_id", "player_1_id", "player_2_id", "player_1_wins", "player_2_wins")
+    _saved_result: typing.Optional[tuple] = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_result = instance._result()
+        return instance
+
+    def _result(self) -> typing.Optional[tuple]:
+        """The values of RESULT_FIELDS or None if some of them are deferred."""
+        try:
+            return tuple(self.__dict__[field] for field in self.RESULT_FIELDS)
+        except KeyError:
+            return None
+
+    def _fetch_result(self) -> typing.Optional[tuple]:
+        """The saved values of RESULT_FIELDS, locked until the transaction ends."""
+        if self.pk is None:
+            return None
+        return Duel.objects.select_for_update().filter(pk=self.pk).values_list(*self.RESULT_FIELDS).first()
+
+    def save(self, *args, **kwargs):
+        if self.tournament_id is None and self.round_id is not None:
+            self.tournament_id = self.round.tournament_id
+        self.is_bye = Player.BYE in (self.player_1_id, self.player_2_id)
+
+        with atomic():
+            # what another transaction saved since this duel was loaded counts, not what was loaded
+            saved_result = self._fetch_result()
+            super().save(*args, **kwargs)
+            result = self._result() or self._fetch_result()
+
+            if saved_result != result:
+                if saved_result is not None:
+                    PlayerStats.apply(duel_records(*saved_result), sign=-1)
+                PlayerStats.apply(duel_records(*result))
+                players = {*(saved_result or ())[1:3], *result[1:3]}
+                tournaments = {(saved_result or result)[0], result[0]}
+                DataVersion.bump(DataVersion.RESULTS, *map(DataVersion.tournament, tournaments),
+                                 *map(DataVersion.player, players))
+                TournamentEvent.results_changed([self])
+            self._saved_result = result
 
     @classmethod
     def without_freewins(cls, from_duels=None):
         if from_duels is None:
             from_duels = cls.objects
 
-        freewin = Player.FREEWIN()
-        return from_duels.exclude(
-            models.Q(player_1=freewin) | models.Q(player_2=freewin)
-        )
+        return from_duels.filter(is_bye=False)
+
+    @classmethod
+    @atomic
+    def set_results(cls, results: typing.Dict['Duel', typing.Tuple[int, int]]):
+        """
+        Sets the wins of player 1 and player 2 of many duels with a single UPDATE.
+
+        Like save() this updates PlayerStats and the results version, and emits the results. The changes are
+        computed from the saved results, which are locked so concurrent submissions are applied one after the other.
+        """
+        saved_results = {}
+        for batch in _batches([duel.pk for duel in results], params_per_item=1):
+            saved_results.update((pk, result) for pk, *result in cls.objects.select_for_update().filter(
+                pk__in=batch).values_list("pk", *cls.RESULT_FIELDS))
+
+        changed, records = {}, []
+        for duel, (player_1_wins, player_2_wins) in results.items():
+            saved_result = tuple(saved_results[duel.pk])
+            duel.tournament_id, duel.player_1_id, duel.player_2_id = saved_result[:3]
+            duel.player_1_wins, duel.player_2_wins = player_1_wins, player_2_wins
+            duel._saved_result = duel._result()
+            if duel._saved_result != saved_result:
+                changed[duel] = player_1_wins, player_2_wins
+                records.append({key: [-value for value in record]
+                                for key, record in duel_records(*saved_result).items()})
+                records.append(duel_records(*duel._result()))
+        if not changed:
+            return
+
+        for batch in _batches(list(changed), params_per_item=5):
+            cls.objects.filter(pk__in=[duel.pk for duel in batch]).update(**{
+                field: models.Case(
+                    *(models.When(pk=duel.pk, then=models.Value(getattr(duel, field))) for duel in batch),
+                    output_field=models.PositiveSmallIntegerField()
+                )
+                for field in ("player_1_wins", "player_2_wins")
+            })
+        PlayerStats.apply(sum_records(records))
+        DataVersion.bump(DataVersion.RESULTS, *{DataVersion.tournament(duel.tournament_id) for duel in changed}, *(
+            DataVersion.player(player) for duel in changed for player in (duel.player_1_id, duel.player_2_id)
+        ))
+        TournamentEvent.results_changed(changed)
 
     def set_player_performance(self, performance: Performance):
         if performance.player not in (self.player_1, self.player_2):
@@ -426,116 +712,525 @@ class Duel(models.Model):
             ('player_1', 'round'),
             ('player_2', 'round'),
         )
+        indexes = [
+            models.Index(fields=['tournament', 'player_1'], name='duel_tournament_player_1_idx'),
+            models.Index(fields=['tournament', 'player_2'], name='duel_tournament_player_2_idx'),
+        ]
 
     def __str__(self):
         return f'{self.player_1}:{self.player_1_wins} vs {self.player_2}:{self.player_2_wins} in {self.round}'
 
 
-def standing(duels, players) -> List[Performance]:
-    player_standings: List[Performance] = []
-
-    for player in players:
-        aggregate = duels.aggregate(
-            match_wins=models.Count("round", filter=models.Q(player_1=player, player_1_wins__gt=models.F(
-                "player_2_wins")) | models.Q(player_2=player, player_2_wins__gt=models.F("player_1_wins")),
-                                    distinct=True),
-            match_losses=models.Count("round", filter=models.Q(player_1=player, player_2_wins__gt=models.F(
-                "player_1_wins")) | models.Q(player_2=player, player_1_wins__gt=models.F("player_2_wins")),
-                                      distinct=True),
-            wins=models.Sum(models.Case(models.When(player_1=player, then='player_1_wins'),
-                                        models.When(player_2=player, then='player_2_wins'))),
-            losses=models.Sum(models.Case(models.When(player_1=player, then='player_2_wins'),
-                                          models.When(player_2=player, then='player_1_wins')))
+class PlayerStats(models.Model):
+    """
+    Materialized match and game record of a player.
+
+    Rows with a tournament hold the record within that tournament including free wins,
+    rows without one hold the all-time record without free wins.
+    They are kept up to date by Duel.save and can be rebuilt with the rebuild_player_stats command.
+    """
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='stats')
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='player_stats',
+                                   null=True, blank=True)
+
+    match_wins = models.PositiveIntegerField(default=0)
+    match_losses = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    # of all-time rows, the player's score in the RankingSnapshot it was written by
+    pagerank = models.FloatField(null=True, blank=True)
+
+    FIELDS = ("match_wins", "match_losses", "wins", "losses")
+
+    class Meta:
+        unique_together = ('tournament', 'player')
+        verbose_name_plural = 'player stats'
+        indexes = [models.Index(fields=['tournament', '-pagerank', 'player'], name='playerstats_pagerank_idx')]
+
+    def __str__(self):
+        return f'{self.player_id} in {self.tournament_id or "all tournaments"}'
+
+    @property
+    def record(self) -> typing.Tuple[int, int, int, int]:
+        return self.match_wins, self.match_losses, self.wins, self.losses
+
+    @classmethod
+    def all_time(cls):
+        """All-time rows of players that have played at least one game or match."""
+        return cls.objects.filter(tournament=None).exclude(match_wins=0, match_losses=0, wins=0, losses=0)
+
+    @classmethod
+    def apply(cls, records: typing.Dict[typing.Tuple[str, typing.Optional[int]], typing.Sequence[int]], sign=1):
+        """
+        Adds records keyed by (player, tournament) with one UPDATE.
+
+        Missing rows are created for positive records. Negative records without a row are dropped,
+        the rebuild_player_stats command repairs rows that got out of sync like that.
+        """
+        records = {key: [value * sign for value in record] for key, record in records.items() if any(record)}
+        if not records:
+            return
+
+        existing = {}
+        for keys in _batches(list(records), params_per_item=2):
+            tournaments = {tournament for _, tournament in keys}
+            condition = models.Q(tournament__in=tournaments - {None})
+            if None in tournaments:
+                condition |= models.Q(tournament=None)
+            # a superset of the keys' rows, without a condition per key that would get too deep for SQLite
+            rows = cls.objects.filter(condition, player__in={player for player, _ in keys})
+            existing.update({
+                (player, tournament): pk for pk, player, tournament in rows.values_list("pk", "player", "tournament")
+                if (player, tournament) in records
+            })
+
+        for batch in _batches(list(existing.items()), params_per_item=2 * len(cls.FIELDS) + 1):
+            cls.objects.filter(pk__in=[pk for _, pk in batch]).update(**{
+                field: models.Case(
+                    *(models.When(pk=pk, then=models.F(field) + records[key][index]) for key, pk in batch),
+                    default=models.F(field), output_field=models.PositiveIntegerField()
+                )
+                for index, field in enumerate(cls.FIELDS)
+            })
+
+        cls.objects.bulk_create(
+            cls(player_id=player, tournament_id=tournament, **dict(zip(cls.FIELDS, record)))
+            for (player, tournament), record in records.items()
+            if (player, tournament) not in existing and min(record) >= 0
         )
 
-        for key in ["wins", "losses"]:  # if querysets are empty, sum will return None. We want 0 instead.
-            aggregate[key] = 0 if aggregate[key] is None else aggregate[key]
+    @classmethod
+    def rank(cls, scores: typing.Dict[str, float]):
+        """Writes the PageRank scores keyed by player to the all-time rows."""
+        rows = list(cls.objects.filter(tournament=None).values_list("pk", "player"))
+        for batch in _batches(rows, params_per_item=3):
+            cls.objects.filter(pk__in=[pk for pk, _ in batch]).update(pagerank=models.Case(
+                *(models.When(pk=pk, then=models.Value(scores.get(player))) for pk, player in batch),
+                output_field=models.FloatField()
+            ))
 
-        performance = Performance(player, **aggregate)
-        bisect.insort_right(player_standings, performance)
+    @classmethod
+    @atomic
+    def rebuild(cls) -> int:
+        """Replaces all rows with the live computation over all duels and returns the number of rows created."""
+        cls.objects.all().delete()
+        rows = [
+            cls(player=performance.player, tournament=tournament, match_wins=performance.match_wins,
+                match_losses=performance.match_losses, wins=performance.wins, losses=performance.losses)
+            for tournament, performances in cls.live_standings()
+            for performance in performances
+            if performance.match_wins or performance.match_losses or performance.wins or performance.losses
+        ]
+        cls.objects.bulk_create(rows)
+        snapshot = RankingSnapshot.objects.first()
+        if snapshot is not None:
+            cls.rank(snapshot.scores)
+        return len(rows)
 
-    return list(reversed(player_standings))  # we sorted from low -> high but want to show high -> low
+    @classmethod
+    def live_standings(cls) -> typing.Iterator[typing.Tuple[typing.Optional[Tournament], List[Performance]]]:
+        """Standings computed from the duels for every tournament and all-time (with tournament None)."""
+        for tournament in Tournament.objects.all():
+            yield tournament, standing(tournament.duels(), tournament.players.filter(is_bye=False))
 
+        yield None, standing(Duel.without_freewins(), Player.playing())
 
-def penalty(rank_1: float, rank_2: float) -> float:
-    # negative weight to create min matching.
-    return -((rank_1 ** 2 - rank_2 ** 2) ** 2)
+    @classmethod
+    def verify(cls) -> typing.Iterator[typing.Tuple[typing.Optional[Tournament], Performance, Performance]]:
+        """Yields (tournament, live, materialized) for every performance that differs from the live computation."""
+        for tournament, live_standing in cls.live_standings():
+            stored = {
+                stats.player_id: stats.record
+                for stats in cls.objects.filter(tournament=tournament)
+            }
+            for performance in live_standing:
+                record = stored.get(performance.player.pk, (0, 0, 0, 0))
+                if record != (performance.match_wins, performance.match_losses, performance.wins, performance.losses):
+                    yield tournament, performance, Performance(performance.player, *record)
+
+
+class DataVersion(models.Model):
+    """A counter that is bumped whenever the data it is named after changes, to tell if derived data is stale."""
+    name = models.CharField(max_length=64, primary_key=True)
+    value = models.PositiveIntegerField(default=0)
+    modified = models.DateTimeField(auto_now=True)
+
+    RESULTS = "results"
+    TOURNAMENTS = "tournaments"  # any tournament was created, changed or deleted
+    RANKING_GRAPH = "ranking-graph"
 
+    def __str__(self):
+        return f'{self.name} v{self.value}'
 
-def ranking(duels, players, draw=False, **kwargs) -> typing.Tuple[typing.Dict[Player, float], typing.ByteString]:
-    player_mapping = {
-        player.name: player for player in players
-    }
+    @staticmethod
+    def player(player_id: str) -> str:
+        """The name of the version that is bumped whenever one of the player's duels changes."""
+        return "player:" + hashlib.sha1(player_id.encode()).hexdigest()
+
+    @staticmethod
+    def tournament(tournament_id: int) -> str:
+        """The name of the version that is bumped whenever the tournament, its players, rounds or duels change."""
+        return f"tournament:{tournament_id}"
 
-    freewin = Player.FREEWIN()
-    all_players = set(players) - {freewin}  # don't count free wins
-    win_graph = networkx.DiGraph()
-    win_graph.add_nodes_from(all_players)
+    @classmethod
+    def get(cls, name: str) -> int:
+        return cls.objects.filter(name=name).values_list("value", flat=True).first() or 0
 
-    duels = duels.filter(  # only duels that contain any wins make sense for ranking
-        models.Q(player_1_wins__gt=0) | models.Q(player_2_wins__gt=0)
-    ).values("player_1", "player_1_wins", "player_2", "player_2_wins")
+    @classmethod
+    def stamp(cls, *names: str) -> typing.Tuple[typing.Tuple[int, ...], typing.Optional[datetime.datetime]]:
+        """The values of several versions and when the last of them changed, with a single query."""
+        versions = {name: (value, modified) for name, value, modified in
+                    cls.objects.filter(name__in=names).values_list("name", "value", "modified")}
+        return (tuple(versions.get(name, (0, None))[0] for name in names),
+                max((modified for _, modified in versions.values()), default=None))
 
-    winning_map = {
-        player: collections.defaultdict(int) for player in players
-    }
+    @classmethod
+    def bump(cls, *names: str):
+        names = set(names)
+        bumped = cls.objects.filter(name__in=names).update(value=models.F("value") + 1, modified=timezone.now())
+        if bumped < len(names):
+            existing = set(cls.objects.filter(name__in=names).values_list("name", flat=True))
+            cls.objects.bulk_create(cls(name=name, value=1) for name in names - existing)
 
-    for duel in duels:
-        player_1 = player_mapping[duel["player_1"]]
-        player_2 = player_mapping[duel["player_2"]]
-        winning_map[player_1][player_2] += duel["player_1_wins"]
-        winning_map[player_2][player_1] += duel["player_2_wins"]
 
-    for player, wins_against in winning_map.items():
-        win_graph.add_weighted_edges_from((opponent, player, wins_against[opponent]) for opponent in wins_against)
+class RankingSnapshot(models.Model):
+    """
+    The all-time PageRank of all players and the state of the duels it was calculated from.
 
-    pageranking = {p: v * 100 for p, v in networkx.pagerank_numpy(win_graph, **kwargs).items()}
+    There is only ever one row. Once the duels change it is recalculated
+    starting from the previous scores, which barely move between two rounds.
+    """
+    max_duel_id = models.PositiveIntegerField(default=0)
+    results_version = models.PositiveIntegerField(default=0)
+    player_count = models.PositiveIntegerField(default=0)
+    scores = JSONField(default=dict)
+    calculated = models.DateTimeField(auto_now=True)
 
-    if draw and win_graph:
-        import io
-        import matplotlib.pyplot as plt
-        from matplotlib.lines import Line2D
-        from matplotlib import colors
+    def __str__(self):
+        return f'Ranking of {self.player_count} players at duel {self.max_duel_id} v{self.results_version}'
+
+    @staticmethod
+    def current_stamp() -> typing.Tuple[int, int, int]:
+        return (
+            Duel.objects.aggregate(max_id=models.Max("id"))["max_id"] or 0,
+            DataVersion.get(DataVersion.RESULTS),
+            Player.without_freewin().count(),
+        )
 
-        plt.figure(figsize=(16, 9))
+    @property
+    def stamp(self) -> typing.Tuple[int, int, int]:
+        return self.max_duel_id, self.results_version, self.player_count
 
-        pos = networkx.shell_layout(win_graph)
-        networkx.draw_networkx_nodes(win_graph, pos, node_size=700)
-        max_wins = max(d["weight"] for (u, v, d) in win_graph.edges(data=True))
-        color_values = [
-            colors.to_hex(
-                colors.hsv_to_rgb((ratio * 0.8 + 0.1, 0.9, (ratio + 1) / 2))
-            )
-            for ratio in map(lambda w: w / max_wins, range(1, max_wins + 1))
-        ]
-        legend = []
+    @classmethod
+    def refresh(cls) -> 'RankingSnapshot':
+        """
+        The snapshot, recalculated first if the duels changed.
+
+        Recalculating writes the scores to PlayerStats.pagerank too, so the ranking can be queried in order.
+        """
+        stamp = cls.current_stamp()
+        snapshot = cls.objects.first() or cls()
+
+        if snapshot.pk is None or snapshot.stamp != stamp:
+            players = {player.pk: player for player in Player.without_freewin()}
+            pageranking, _ = engine.ranking(Duel.without_freewins(), players.values(), start={
+                players[name]: score for name, score in snapshot.scores.items() if name in players
+            })
+            snapshot.max_duel_id, snapshot.results_version, snapshot.player_count = stamp
+            snapshot.scores = {player.pk: score for player, score in pageranking.items()}
+            snapshot.save()
+            PlayerStats.rank(snapshot.scores)
+
+        return snapshot
+
+    @classmethod
+    def current(cls) -> typing.Dict[Player, float]:
+        """The PageRank of all players except FREE WIN, recalculated only if the duels changed."""
+        snapshot = cls.refresh()
+        players = {player.pk: player for player in Player.without_freewin()}
+        return {players[name]: score for name, score in snapshot.scores.items() if name in players}
+
+
+class RankingGraph(models.Model):
+    """The drawn win graph of a RankingSnapshot stamp, served by its content hash."""
+    digest = models.CharField(max_length=64, primary_key=True)
+    image = models.BinaryField()
+    max_duel_id = models.PositiveIntegerField()
+    results_version = models.PositiveIntegerField()
+    player_count = models.PositiveIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    KEEP = 5  # older graphs are deleted, pages that still show them were rendered a few rankings ago.
+
+    class Meta:
+        ordering = ('-created', )
+
+    def __str__(self):
+        return f'Graph {self.digest[:8]} at duel {self.max_duel_id} v{self.results_version}'
+
+    def get_absolute_url(self):
+        return reverse('ranking_graph', args=[self.digest])
 
-        winner_edges = [(v, u, d) for (u, v, d) in win_graph.edges(data=True) if
-                        d["weight"] > win_graph[v][u]["weight"]]
-        loser_edges = [(v, u, d) for (u, v, d) in win_graph.edges(data=True) if
-                       d["weight"] <= win_graph[v][u]["weight"]]
+    @classmethod
+    def current(cls) -> typing.Optional['RankingGraph']:
+        """The graph of the current ranking. If there is none yet a job to draw it is enqueued."""
+        max_duel_id, results_version, player_count = RankingSnapshot.current_stamp()
+        graph = cls.objects.defer("image").filter(
+            max_duel_id=max_duel_id, results_version=results_version, player_count=player_count
+        ).first()
+
+        if graph is None:
+            Job.ranking_graph()
+        return graph
+
+    @classmethod
+    def draw(cls) -> typing.Optional['RankingGraph']:
+        """Draws the graph for the current stamp unless it exists already."""
+        max_duel_id, results_version, player_count = RankingSnapshot.current_stamp()
+        graph = cls.objects.filter(
+            max_duel_id=max_duel_id, results_version=results_version, player_count=player_count
+        ).first()
+        if graph is not None:
+            return graph
+
+        nodes, edges = engine.win_graph(Duel.without_freewins(), Player.playing())
+        if not edges:
+            return None
+
+        image = engine.draw_win_graph(nodes, edges)
+        graph, _ = cls.objects.update_or_create(digest=hashlib.sha256(image).hexdigest(), defaults=dict(
+            image=image, max_duel_id=max_duel_id, results_version=results_version, player_count=player_count
+        ))
+        cls.objects.exclude(pk__in=cls.objects.values_list("pk", flat=True)[:cls.KEEP]).delete()
+        DataVersion.bump(DataVersion.RANKING_GRAPH)  # pages waiting for the graph can show it now
+        return graph
+
+
+class Job(models.Model):
+    """
+    Work that runs outside of requests, in the run_jobs command.
+
+    Pairing jobs are unique per tournament and round number, so enqueueing one again doesn't run it twice. Drawing
+    the ranking graph is enqueued while none is pending, it skips the drawing if the graph exists when it runs.
+    """
+    NEXT_ROUND, RANKING_GRAPH = "next_round", "ranking_graph"
+    KINDS = ((NEXT_ROUND, "Next round"), (RANKING_GRAPH, "Ranking graph"))
 
-        # we want to overlay bigger wins with smaller ones
-        for wins, color in reversed(list(enumerate(color_values, start=1))):
-            # we switch directions of edges so they show to winning against.
-            # pagerank wants the direction towards the winner to show "significance"
-            w_edges = [(v, u) for (u, v, d) in winner_edges if d["weight"] == wins]
-            networkx.draw_networkx_edges(win_graph, pos, edgelist=w_edges, width=5, edge_color=color, arrowstyle="-|>")
-            l_edges = [(v, u) for (u, v, d) in loser_edges if d["weight"] == wins]
-            networkx.draw_networkx_edges(win_graph, pos, edgelist=l_edges, width=2, edge_color=color, arrowstyle="-|>")
+    QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+    STATES = ((QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed"))
 
-            legend.append(Line2D([0], [0], marker='o', color='w', label=f'{wins}', markerfacecolor=color, markersize=6))
+    kind = models.CharField(max_length=32, choices=KINDS)
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name="jobs", null=True, blank=True)
+    round_number = models.PositiveSmallIntegerField(null=True, blank=True)
+    state = models.CharField(max_length=16, choices=STATES, default=QUEUED)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
 
-        networkx.draw_networkx_labels(win_graph, pos, font_size=10)
+    class Meta:
+        ordering = ("created", "pk")
+        unique_together = ("kind", "tournament", "round_number")
+        indexes = [models.Index(fields=["state", "created"], name="job_state_created_idx")]
 
-        plt.legend(handles=legend)
+    def __str__(self):
+        if self.tournament_id is None:
+            return f"{self.get_kind_display()} ({self.state})"
+        return f"{self.get_kind_display()} {self.round_number} of {self.tournament_id} ({self.state})"
 
-        bytes_io = io.BytesIO()
-        plt.savefig(bytes_io, format="png")
-        bytes_io.seek(0)
-        return pageranking, base64.b64encode(bytes_io.read())
+    @classmethod
+    def next_round(cls, tournament: Tournament, round_number: int) -> 'Job':
+        """Enqueues pairing round round_number of tournament, a failed job for it is queued again."""
+        job, created = cls.objects.get_or_create(kind=cls.NEXT_ROUND, tournament=tournament,
+                                                 round_number=round_number)
+        if not created and job.state == cls.FAILED:
+            cls.objects.filter(pk=job.pk, state=cls.FAILED).update(state=cls.QUEUED, error="")
+            job.refresh_from_db()
+        DataVersion.bump(DataVersion.tournament(tournament.pk))  # the page shows the pairing
+        return job
 
-    return pageranking, b""
+    @classmethod
+    def ranking_graph(cls) -> 'Job':
+        """Enqueues drawing the graph of the current ranking, unless that is pending already."""
+        return (cls.pending().filter(kind=cls.RANKING_GRAPH).first()
+                or cls.objects.create(kind=cls.RANKING_GRAPH))
+
+    @classmethod
+    def pending(cls):
+        return cls.objects.filter(state__in=(cls.QUEUED, cls.RUNNING))
+
+    @classmethod
+    def claim(cls, stale_after: datetime.timedelta) -> typing.Optional['Job']:
+        """
+        Marks the oldest queued job as running and returns it, None if nothing is queued.
+
+        Jobs running longer than stale_after are queued again. Their worker died and its transaction was
+        rolled back, or it is still running and the job finds its work done when it runs again.
+        """
+        now = timezone.now()
+        cls.objects.filter(state=cls.RUNNING, started__lt=now - stale_after).update(state=cls.QUEUED)
+        for pk in cls.objects.filter(state=cls.QUEUED).values_list("pk", flat=True)[:10]:
+            # the worker that changes the state first gets the job, the others try the next one
+            if cls.objects.filter(pk=pk, state=cls.QUEUED).update(state=cls.RUNNING, started=now):
+                return cls.objects.get(pk=pk)
+        return None
+
+    def run(self):
+        """Runs the job in one transaction and records whether it failed."""
+        try:
+            with metrics.measure(f"job {self.kind}"), transaction.atomic():
+                getattr(self, f"_run_{self.kind}")()
+                self._finish(self.DONE)
+        except Exception:
+            logging.getLogger(__name__).exception("%s failed", self)
+            self.error = traceback.format_exc()
+            self._finish(self.FAILED)
+
+    def _finish(self, state: str):
+        self.state, self.finished = state, timezone.now()
+        self.save(update_fields=["state", "error", "finished"])
+        if self.tournament_id is not None:
+            DataVersion.bump(DataVersion.tournament(self.tournament_id))
+
+    def _run_next_round(self):
+        # locks the tournament, so the same round isn't paired twice at the same time
+        tournament = Tournament.objects.select_for_update().get(pk=self.tournament_id)
+        last_round_number = tournament.rounds.aggregate(number=models.Max("number"))["number"] or 0
+        if tournament.finished or last_round_number != self.round_number - 1:
+            return  # paired already or the tournament moved on
+
+        try:
+            tournament.start_next_round()
+        except PairingError as error:
+            logging.getLogger(__name__).warning("Finished %s: %s", tournament, error)
+            self.error = "Couldn't pair all players for the next round, finished the tournament."
+            tournament.finish()
+
+    def _run_ranking_graph(self):
+        RankingGraph.draw()
+
+
+class TournamentEvent(models.Model):
+    """
+    A change of a tournament for its live page, streamed as a Server-Sent Event by mtg_pairings.events.
+
+    Events are written in the transaction of the change, so nobody sees one that is rolled back.
+    """
+    ROUND, RESULTS, STANDING, FINISHED = "round", "results", "standing", "finished"
+    KINDS = ((ROUND, "Round"), (RESULTS, "Results"), (STANDING, "Standing"), (FINISHED, "Finished"))
+
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name="events")
+    kind = models.CharField(max_length=16, choices=KINDS)
+    data = JSONField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("pk",)
+        indexes = [models.Index(fields=["tournament", "id"], name="event_tournament_id_idx")]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} of {self.tournament_id}"
+
+    @classmethod
+    def round_created(cls, tournament_round: Round, duels: typing.Iterable['Duel']):
+        """Emits the pairings of a new round and the standing it starts with."""
+        cls.objects.create(tournament_id=tournament_round.tournament_id, kind=cls.ROUND, data={
+            "number": tournament_round.number,
+            "duels": [[duel.pk, duel.player_1_id, duel.player_2_id, duel.player_1_wins, duel.player_2_wins]
+                      for duel in duels],
+        })
+        cls.standing_changed(tournament_round.tournament_id)
+
+    @classmethod
+    def results_changed(cls, duels: typing.Iterable['Duel']):
+        """Emits the results of duels and the standings of their tournaments."""
+        results = collections.defaultdict(list)
+        for duel in duels:
+            results[duel.tournament_id].append([duel.pk, duel.player_1_wins, duel.player_2_wins])
+
+        cls.objects.bulk_create(cls(tournament_id=tournament_id, kind=cls.RESULTS, data={"duels": tournament_results})
+                                for tournament_id, tournament_results in results.items())
+        for tournament_id in results:
+            cls.standing_changed(tournament_id)
+
+    @classmethod
+    def standing_outdated(cls, tournament_ids: typing.Iterable[int]):
+        """Drops the standings of tournaments that changed without emitting one, like when a duel is deleted."""
+        cls.objects.filter(tournament__in=tournament_ids, kind=cls.STANDING).delete()
+
+    @classmethod
+    def standing_changed(cls, tournament_id: int):
+        cls.objects.create(tournament_id=tournament_id, kind=cls.STANDING, data={"rows": [
+            [performance.player.name, performance.player.get_absolute_url(), performance.match_wins,
+             performance.match_losses, performance.wins, performance.losses,
+             round(performance.opponent_match_win_percentage, 4), round(performance.opponent_win_percentage, 4)]
+            for performance in Tournament(pk=tournament_id).standing
+        ]})
+
+
+@metrics.instrument
+def standing(duels, players) -> List[Performance]:
+    """Calculates the performances of all players over duels with a single query."""
+    # round is part of the values so duels with the same result don't collapse on distinct querysets.
+    return engine.results_standing(
+        duels.values_list("player_1", "player_2", "player_1_wins", "player_2_wins", "round"), players
+    )
+
+
+def _batches(items: list, params_per_item: int) -> typing.Iterator[list]:
+    """Splits items so statements with params_per_item parameters each stay below the database's limit."""
+    limit = connection.features.max_query_params
+    size = max(1, limit // params_per_item - 1) if limit else max(1, len(items))
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def duel_records(tournament_id: typing.Optional[int], player_1: str, player_2: str, player_1_wins: int,
+                 player_2_wins: int):
+    """
+    The records a duel adds to PlayerStats keyed by (player, tournament).
+
+    With tournament_id None only the all-time records are returned.
+    """
+    player_1_won, player_2_won = int(player_1_wins > player_2_wins), int(player_2_wins > player_1_wins)
+    records = {
+        player_1: (player_1_won, player_2_won, player_1_wins, player_2_wins),
+        player_2: (player_2_won, player_1_won, player_2_wins, player_1_wins),
+    }
+    is_freewin = Player.BYE in records
+    records.pop(Player.BYE, None)
+
+    keyed_records = {}
+    if tournament_id is not None:
+        keyed_records.update({(player, tournament_id): record for player, record in records.items()})
+    if not is_freewin:  # free wins don't count for all-time records
+        keyed_records.update({(player, None): record for player, record in records.items()})
+
+    return keyed_records
+
+
+def sum_records(records: typing.Iterable[typing.Dict[typing.Tuple[str, typing.Optional[int]], typing.Sequence[int]]]):
+    """Adds up the records of several duel_records()."""
+    total = collections.defaultdict(lambda: (0, 0, 0, 0))
+    for keyed_records in records:
+        for key, record in keyed_records.items():
+            total[key] = tuple(map(operator.add, total[key], record))
+    return dict(total)
+
+
+def standing_key(performance: Performance) -> tuple:
+    """Orders by match win percentage, ties are broken by OMW%, GW% and OGW% in that order."""
+    return (performance.match_win_percentage, performance.opponent_match_win_percentage, performance.win_percentage,
+            performance.opponent_win_percentage)
+
+
+def sort_standing(performances: typing.Iterable[Performance]) -> List[Performance]:
+    # sorting low -> high keeps the order of ties, which we reverse with the list to show high -> low
+    return list(reversed(sorted(performances, key=standing_key)))
+
+
+class PairingError(Exception):
+    """Raised if the players of a round can't be paired."""
 
 
 @receiver(models.signals.m2m_changed, sender=Tournament.players.through)
@@ -546,17 +1241,47 @@ def assure_players(instance: Tournament, action, **_):
     if instance.players.count() < 2:
         raise ValidationError('A tournament needs at least 2 players.')
     if instance.players.count() % 2:
-        freewin = Player.FREEWIN()
-        assert freewin is not None, "Player.FREEWIN not set!"
-        if freewin in instance.players.all():
-            raise ValidationError(f"Remove the {freewin} player.")
+        if instance.players.filter(is_bye=True).exists():
+            raise ValidationError(f"Remove the {Player.BYE} player.")
 
-        instance.players.add(freewin)
+        instance.players.add(Player.bye())
         instance.save()
     if not instance.rounds.exists():
         instance.start_first_round()
 
 
+@receiver(models.signals.m2m_changed, sender=Tournament.players.through)
+def bump_results_version(instance, action, reverse: bool, pk_set, **_):
+    """Joining or leaving a tournament changes the ranking, duels bump the version when they are written."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        tournament_ids = (pk_set or ()) if reverse else (instance.pk,)  # instance is a player if reverse
+        DataVersion.bump(DataVersion.RESULTS, *map(DataVersion.tournament, tournament_ids))
+        if action != 'post_add':  # adding players pairs the first round, which emits the standing
+            TournamentEvent.standing_outdated(tournament_ids)
+
+
+@receiver(models.signals.post_save, sender=Tournament)
+@receiver(models.signals.post_delete, sender=Tournament)
+def bump_tournament_versions(instance: Tournament, **_):
+    DataVersion.bump(DataVersion.TOURNAMENTS, DataVersion.tournament(instance.pk))
+
+
+@receiver(models.signals.post_save, sender=Player)
+@receiver(models.signals.post_delete, sender=Player)
+def bump_results_version_of_players(instance: Player, created: bool = True, **_):  # deletes aren't "created"
+    """Who is ranked changes with new and deleted players, even without duels."""
+    if created:
+        DataVersion.bump(DataVersion.RESULTS)
+
+
+@receiver(models.signals.post_delete, sender=Duel)
+def remove_duel_from_stats(instance: Duel, **_):
+    result = instance._saved_result or instance._result()
+    PlayerStats.apply(duel_records(*result), sign=-1)
+    DataVersion.bump(DataVersion.RESULTS, DataVersion.tournament(result[0]), *map(DataVersion.player, result[1:3]))
+    TournamentEvent.standing_outdated([result[0]])
+
+
 @receiver(models.signals.post_save, sender=User)
 def connect_user_and_player(instance: User, created: bool, **_):
     """
@@ -594,5 +1319,5 @@ def connect_user_and_player(instance: User, created: bool, **_):
 
 @receiver(models.signals.pre_save, sender=Player)
 def capitalize_player_names(instance: Player, **_):
-    if instance.name != "FREE WIN":
-        instance.name = " ".join(instance.name.strip().title().split())
+    if not instance.is_bye:
+        instance.name = Player.normalize_name(instance.name)
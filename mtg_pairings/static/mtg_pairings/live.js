@@ -0,0 +1,74 @@
+// Patches the tournament page with its live changes, see mtg_pairings.events.
+(function () {
+    "use strict";
+    var source = new EventSource(document.currentScript.dataset.events);
+
+    function reload() {
+        source.close();
+        window.location.reload();
+    }
+
+    // a new round brings a new form to enter its results, that's rendered by the server
+    source.addEventListener("round", reload);
+    source.addEventListener("finished", reload);
+
+    // a job that fails to pair the round sends no event, the reloaded page shows the form again then
+    if (document.getElementById("pairing")) {
+        setTimeout(reload, 5000);
+    }
+
+    source.addEventListener("results", function (event) {
+        JSON.parse(event.data).duels.forEach(function (duel) {
+            var id = duel[0], wins = [duel[1], duel[2]];
+            var row = document.querySelector('[data-duel="' + id + '"]');
+            if (row) {
+                row.querySelector(".player-1-wins").textContent = wins[0];
+                row.querySelector(".player-2-wins").textContent = wins[1];
+            }
+            [1, 2].forEach(function (player) {
+                var input = document.querySelector('[name="duel-' + id + '-player' + player + '"]');
+                if (input && input !== document.activeElement) {
+                    input.value = wins[player - 1];
+                }
+            });
+        });
+    });
+
+    function cell(tag, text, className) {
+        var element = document.createElement(tag);
+        element.textContent = text;
+        if (className) {
+            element.className = className;
+        }
+        return element;
+    }
+
+    source.addEventListener("standing", function (event) {
+        var body = document.getElementById("standing");
+        var rows = document.createDocumentFragment();
+        JSON.parse(event.data).rows.forEach(function (standing, index) {
+            // name, url, match wins, match losses, wins, losses, OMW, OGW like the rendered table
+            var rank = index + 1, row = document.createElement("tr");
+            if (rank <= 3) {
+                row.className = "player-row-" + rank;
+            }
+            var header = cell("th", rank <= 3 ? rank : "");
+            header.scope = "row";
+            row.appendChild(header);
+
+            var name = cell("td", ""), link = cell("a", " " + standing[0] + " ", "text-secondary");
+            link.href = standing[1];
+            name.style.width = "80%";
+            name.appendChild(link);
+            row.appendChild(name);
+
+            row.appendChild(cell("td", standing[2] + " : " + standing[3], "text-right"));
+            row.appendChild(cell("td", standing[4] + " : " + standing[5], "text-right"));
+            row.appendChild(cell("td", Math.round(standing[6] * 100) + "%", "text-right"));
+            row.appendChild(cell("td", Math.round(standing[7] * 100) + "%", "text-right"));
+            rows.appendChild(row);
+        });
+        body.textContent = "";
+        body.appendChild(rows);
+    });
+})();
@@ -1,9 +1,43 @@
+import datetime
+import re
+import shutil
+import typing
+
+import networkx
+import numpy
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from hypothesis import given, strategies, reproduce_failure
 
 # Create your tests here.
+from . import api
+from . import engine
+from . import history
+from . import metrics
 from . import models
 
 
+def start_tournament(name: str, player_count: int) -> models.Tournament:
+    """A tournament of new players whose first round is paired."""
+    players = [models.Player.objects.create(name=f"{name} {index}") for index in range(player_count)]
+    tournament = models.Tournament.objects.create(name=name, teams={})
+    tournament.players.add(*players)
+    return tournament
+
+
+def round_data(tournament_round: models.Round, wins=(2, 0)) -> dict:
+    """What the round form submits if every player 1 won with wins."""
+    data = {"round": tournament_round.pk}
+    for duel in tournament_round.duels.filter(is_bye=False):
+        data[f"duel-{duel.pk}-player1"], data[f"duel-{duel.pk}-player2"] = wins
+    return data
+
+
 def performances(**kwargs):
     parameters = dict(player=strategies.builds(models.Player, name=strategies.text()),
                       match_wins=strategies.integers(min_value=0), wins=strategies.integers(min_value=0),
@@ -14,7 +48,7 @@ def performances(**kwargs):
 
 @given(performances(), performances())
 def test_penalty(player_1: models.Performance, player_2: models.Performance):
-    penalty: float = models.penalty(float(player_1), float(player_2))
+    penalty: float = engine.penalty(float(player_1), float(player_2))
     if player_1 == player_2:
         assert penalty == 0
     else:
@@ -30,3 +64,623 @@ def test_performance_add(performance_1: models.Performance, performance_2: model
     assert a.wins == performance_1.wins + performance_2.wins
     assert a.losses == performance_1.losses + performance_2.losses
 
+
+def weighted_edges(max_nodes=12):
+    return strategies.integers(min_value=1, max_value=max_nodes).flatmap(lambda size: strategies.tuples(
+        strategies.just(size),
+        strategies.lists(strategies.tuples(strategies.integers(0, size - 1), strategies.integers(0, size - 1),
+                                           strategies.integers(min_value=0, max_value=5)),
+                         unique_by=lambda edge: edge[:2]),
+    ))
+
+
+@given(weighted_edges())
+def test_pagerank_matches_networkx(graph):
+    size, edges = graph
+    win_graph = networkx.DiGraph()
+    win_graph.add_nodes_from(range(size))
+    win_graph.add_weighted_edges_from(edges)
+    expected = networkx.pagerank_numpy(win_graph)
+
+    sources, targets, weights = zip(*edges) if edges else ([], [], [])
+    ranks = engine.pagerank(numpy.array(sources, dtype=int), numpy.array(targets, dtype=int),
+                            numpy.array(weights, dtype=float), size)
+
+    assert numpy.allclose(ranks, [expected[node] for node in range(size)], atol=1e-8)
+
+
+def previous_opponents(max_players=14):
+    return strategies.integers(min_value=1, max_value=max_players // 2).map(lambda half: half * 2).flatmap(
+        previous_opponents_of)
+
+
+def previous_opponents_of(size):
+    return strategies.lists(strategies.tuples(strategies.integers(0, size - 1), strategies.integers(0, size - 1)),
+                            max_size=size * 2).map(lambda pairs: to_bitsets(size, pairs))
+
+
+def to_bitsets(size, pairs):
+    opponents = [0] * size
+    for player, opponent in pairs:
+        if player != opponent:
+            opponents[player] |= 1 << opponent
+            opponents[opponent] |= 1 << player
+    return opponents
+
+
+@given(previous_opponents(), strategies.sampled_from([0, 10_000]))
+def test_swiss_pairing(opponents, max_steps):
+    pairing = engine.swiss_pairing(opponents, max_steps=max_steps)
+
+    if pairing is None:
+        played = networkx.Graph()
+        played.add_nodes_from(range(len(opponents)))
+        played.add_edges_from((player, opponent) for player in range(len(opponents))
+                              for opponent in range(len(opponents)) if opponents[player] >> opponent & 1)
+        allowed = networkx.complement(played)
+        assert len(networkx.max_weight_matching(allowed, maxcardinality=True)) * 2 < len(opponents)
+    else:
+        assert sorted(player for pair in pairing for player in pair) == list(range(len(opponents)))
+        assert not any(opponents[player] >> opponent & 1 for player, opponent in pairing)
+
+
+def score_groups(max_groups=4):
+    """Previous opponents of players in score groups of an even size, and the groups, best first."""
+    def with_opponents(halves):
+        groups = [len(halves) - index for index, half in enumerate(halves) for _ in range(half * 2)]
+        return strategies.tuples(previous_opponents_of(len(groups)), strategies.just(groups))
+
+    return strategies.lists(strategies.integers(1, 3), min_size=1, max_size=max_groups).flatmap(with_opponents)
+
+
+@given(score_groups())
+def test_swiss_pairing_falls_back_to_pairing_within_score_groups(opponents_and_groups):
+    opponents, groups = opponents_and_groups
+    pairing = engine.swiss_pairing(opponents, groups, max_steps=0)
+
+    def can_pair(players):
+        allowed = networkx.Graph()
+        allowed.add_edges_from((player, opponent) for player in players for opponent in players
+                               if player < opponent and not opponents[player] >> opponent & 1)
+        return len(networkx.max_weight_matching(allowed, maxcardinality=True)) * 2 == len(players)
+
+    if all(can_pair([player for player in range(len(groups)) if groups[player] == group]) for group in set(groups)):
+        assert all(groups[player] == groups[opponent] for player, opponent in pairing)
+    if pairing is not None:
+        assert sorted(player for pair in pairing for player in pair) == list(range(len(opponents)))
+        assert not any(opponents[player] >> opponent & 1 for player, opponent in pairing)
+    else:
+        assert not can_pair(range(len(opponents)))
+
+
+def test_swiss_pairing_of_many_players():
+    size = 4096
+    pairing = engine.swiss_pairing(to_bitsets(size, [(player, player + 1) for player in range(0, size, 2)]))
+
+    assert sorted(player for pair in pairing for player in pair) == list(range(size))
+
+
+@given(strategies.lists(strategies.floats(min_value=0, max_value=100), min_size=2, max_size=12).filter(
+    lambda ranks: len(ranks) % 2 == 0))
+def test_ranking_pairing_is_optimal(ranks):
+    player_ranking = {models.Player(name=str(index)): rank for index, rank in enumerate(ranks)}
+
+    def summed_penalty(pairing):
+        return sum(engine.penalty(player_ranking[player], player_ranking[opponent]) for player, opponent in pairing)
+
+    pairing = engine.ranking_pairing(player_ranking, player_ranking)
+    exact_pairing = engine.ranking_pairing(player_ranking, player_ranking, exact=True)
+
+    assert sorted(p.name for pair in pairing for p in pair) == sorted(p.name for p in player_ranking)
+    assert summed_penalty(pairing) >= summed_penalty(exact_pairing) - abs(summed_penalty(exact_pairing)) * 1e-9
+
+
+@given(strategies.lists(strategies.tuples(strategies.integers(0, 7), strategies.integers(0, 7),
+                                          strategies.integers(0, 2), strategies.integers(0, 2))
+                        .filter(lambda result: result[0] != result[1]), max_size=30))
+def test_tiebreakers_average_the_floored_opponent_percentages(results):
+    players = [models.Player(name=str(index)) for index in range(8)]
+    performances = engine.results_standing(
+        ((str(player_1), str(player_2), wins_1, wins_2) for player_1, player_2, wins_1, wins_2 in results), players
+    )
+    by_index = {int(performance.player.name): performance for performance in performances}
+
+    def floored_mean(opponents, percentage):
+        return sum(max(percentage(o), engine.TIEBREAKER_FLOOR) for o in opponents) / len(opponents) if opponents else 0
+
+    for index, performance in by_index.items():
+        opponents = [by_index[player_1 + player_2 - index] for player_1, player_2, *_ in results
+                     if index in (player_1, player_2)]
+        assert performance.opponent_match_win_percentage == pytest.approx(
+            floored_mean(opponents, lambda opponent: opponent.match_win_percentage))
+        assert performance.opponent_win_percentage == pytest.approx(
+            floored_mean(opponents, lambda opponent: opponent.win_percentage))
+
+
+def test_opponent_match_wins_break_ties_before_game_wins():
+    def performance(name, *record, opponent_match_win_percentage):
+        return models.Performance(models.Player(name=name), *record,
+                                  opponent_match_win_percentage=opponent_match_win_percentage)
+
+    standing = models.sort_standing([
+        performance("More games", 2, 1, 5, 3, opponent_match_win_percentage=0.4),
+        performance("Fewer matches", 1, 2, 6, 2, opponent_match_win_percentage=1.0),
+        performance("Stronger opponents", 2, 1, 4, 3, opponent_match_win_percentage=0.9),
+    ])
+
+    assert [performance.player.name for performance in standing] == ["Stronger opponents", "More games",
+                                                                     "Fewer matches"]
+
+
+@given(strategies.lists(strategies.floats(min_value=0, max_value=20)))
+def test_histogram_counts_are_cumulative(values):
+    histogram = metrics.Histogram(metrics.SECONDS_BUCKETS)
+    for value in values:
+        histogram.observe(value)
+
+    for bound, count in histogram.cumulative():
+        assert count == sum(1 for value in values if bound == "+Inf" or value <= float(bound))
+    assert histogram.count == len(values)
+
+
+def measured_calls(name: str) -> typing.List[int]:
+    """How often each histogram of this process observed name."""
+    return [histograms[name].count if name in histograms else 0 for _, _, histograms in metrics.HISTOGRAMS.values()]
+
+
+@pytest.mark.django_db
+def test_metrics_middleware_measures_views_by_name(client, settings):
+    before = measured_calls("view tournament_list")
+    client.get(reverse("tournament_list"))
+    assert measured_calls("view tournament_list") == [count + 1 for count in before]
+
+    settings.METRICS_ENABLED = False
+    client.get(reverse("tournament_list"))
+    assert measured_calls("view tournament_list") == [count + 1 for count in before]
+
+
+@pytest.mark.django_db
+def test_metrics_are_only_shown_to_staff(client, settings):
+    assert client.get(reverse("metrics")).status_code == 403
+    client.force_login(User.objects.create_user("player"))
+    assert client.get(reverse("metrics")).status_code == 403
+
+    client.force_login(User.objects.create_user("staff", is_staff=True))
+    response = client.get(reverse("metrics"))
+    assert response.status_code == 200
+    assert 'mtg_pairings_seconds_count{name="view metrics"}' in response.content.decode()
+
+    settings.METRICS_ENABLED = False
+    assert client.get(reverse("metrics")).status_code == 404
+
+
+def test_metrics_of_all_worker_processes_are_added_up(settings, tmp_path):
+    settings.METRICS_DIR = str(tmp_path)
+    with metrics.measure("worker"):
+        pass
+    metrics.flush()
+    count = metrics.HISTOGRAMS["seconds"][2]["worker"].count
+    for index, path in enumerate(tmp_path.glob("*.json")):
+        shutil.copy(str(path), str(tmp_path / f"exited-{index}.json"))  # like a worker that exited
+
+    assert f'mtg_pairings_seconds_count{{name="worker"}} {count * 2}\n' in metrics.exposition()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("player_count", [8, 64, 256])
+def test_tournament_page_query_budget(client, django_assert_num_queries, player_count):
+    players = [models.Player.objects.create(name=f"Player {index}") for index in range(player_count)]
+    tournament = models.Tournament.objects.create(name="Budget", teams={})
+    tournament.players.add(*players)
+    tournament.start_next_round()
+    client.force_login(User.objects.create_user("budget", first_name="Budget"))
+
+    with django_assert_num_queries(7):  # session, user, versions, tournament, players, rounds, duels with players
+        response = client.get(tournament.get_absolute_url())
+
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_unchanged_tournament_page_is_not_modified(client, django_assert_num_queries):
+    players = [models.Player.objects.create(name=f"Player {index}") for index in range(8)]
+    tournament = models.Tournament.objects.create(name="Conditional", teams={})
+    tournament.players.add(*players)
+    client.force_login(User.objects.create_user("conditional", first_name="Conditional"))
+
+    response = client.get(tournament.get_absolute_url())
+    assert "no-cache" in response["Cache-Control"]
+    with django_assert_num_queries(3):  # session, user, versions
+        assert client.get(tournament.get_absolute_url(), HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 304
+
+    models.Duel.set_results({tournament.current_round.duels.first(): (2, 0)})
+    assert client.get(tournament.get_absolute_url(), HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 200
+
+    tournament.finish()
+    assert "max-age=604800" in client.get(tournament.get_absolute_url())["Cache-Control"]
+
+
+@pytest.mark.django_db
+def test_pages_are_rendered_again_after_logging_in_again(client):
+    tournament = start_tournament("Login", 4)
+    user = User.objects.create_user("login", first_name="Login")
+    client.force_login(user)
+    etag = client.get(tournament.get_absolute_url())["ETag"]
+
+    client.logout()
+    client.force_login(user)  # with a new session and CSRF token, which the cached form has the old one of
+
+    assert client.get(tournament.get_absolute_url(), HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_tournament_duels_use_the_tournament_indexes():
+    players = [models.Player.objects.create(name=f"Player {index}") for index in range(32)]
+    for index in range(4):
+        tournament = models.Tournament.objects.create(name=f"Explain {index}", teams={})
+        tournament.players.add(*players)
+
+    sql, params = tournament.duels(players[0]).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")  # the seeded tables are too small to need an index
+        cursor.execute(f"EXPLAIN {sql}", params)
+        plan = "\n".join(line for line, in cursor.fetchall())
+
+    assert "mtg_pairings_round" not in plan
+    assert "Unique" not in plan and "Aggregate" not in plan
+    assert "duel_tournament_player_" in plan
+
+
+@pytest.fixture
+def migrate():
+    """Migrates the test database to a migration of mtg_pairings and returns its models, the latest one afterwards."""
+    executor = MigrationExecutor(connection)
+    latest = executor.loader.graph.leaf_nodes("mtg_pairings")
+
+    def to(name: str):
+        executor.loader.build_graph()
+        executor.migrate([("mtg_pairings", name)])
+        return executor.loader.project_state([("mtg_pairings", name)]).apps
+
+    yield to
+    to(latest[0][1])
+
+
+@pytest.mark.django_db(transaction=True)
+def test_migrations_fill_in_the_new_columns_of_existing_duels(migrate):
+    apps = migrate("0006_auto_20190521_1142")
+    Player, Duel = apps.get_model("mtg_pairings", "Player"), apps.get_model("mtg_pairings", "Duel")
+    players = [Player.objects.create(name=name) for name in ("Old 1", "Old 2", "Old 3", models.Player.BYE)]
+    tournament = apps.get_model("mtg_pairings", "Tournament").objects.create(name="Old", teams={})
+    tournament.players.add(*players)
+    tournament_round = apps.get_model("mtg_pairings", "Round").objects.create(tournament=tournament, number=1)
+    Duel.objects.create(round=tournament_round, player_1=players[0], player_2=players[1], player_1_wins=2,
+                        player_2_wins=1)
+    Duel.objects.create(round=tournament_round, player_1=players[2], player_2=players[3], player_1_wins=2)
+
+    apps = migrate("0013_tournament_event")
+    apps.get_model("mtg_pairings", "RankingSnapshot").objects.create(scores={"Old 1": 0.6, "Old 2": 0.4})
+    migrate("0014_playerstats_pagerank")
+
+    assert list(models.PlayerStats.verify()) == []
+    assert models.Duel.objects.filter(tournament=tournament.pk).count() == 2
+    assert list(models.Duel.objects.filter(is_bye=True).values_list("player_1", flat=True)) == ["Old 3"]
+    assert list(models.Player.objects.filter(is_bye=True)) == [models.Player.bye()]
+    assert dict(models.PlayerStats.all_time().values_list("player", "pagerank")) == {"Old 1": 0.6, "Old 2": 0.4}
+
+
+@pytest.mark.django_db
+def test_performances_match_player_stats(django_assert_num_queries):
+    players = [models.Player.objects.create(name=f"Player {index}") for index in range(9)]
+    tournament = models.Tournament.objects.create(name="Performances", teams={})
+    tournament.players.add(*players)
+    for index, duel in enumerate(tournament.current_round.duels.filter(is_bye=False)):
+        duel.player_1_wins, duel.player_2_wins = [(2, 0), (1, 2), (1, 1)][index % 3]
+        duel.save()
+
+    with django_assert_num_queries(1):
+        performances = tournament.performances()
+
+    stats = {stats.player_id: stats.record for stats in tournament.player_stats.all()}
+    assert len(performances) == len(players)
+    for performance in performances:
+        record = (performance.match_wins, performance.match_losses, performance.wins, performance.losses)
+        assert record == stats.get(performance.player.pk, (0, 0, 0, 0))
+
+
+@pytest.mark.django_db
+def test_standing_of_all_players_takes_one_query(django_assert_num_queries):
+    tournament = start_tournament("Standing", 6)
+    models.Duel.set_results(dict(zip(tournament.current_round.duels.all(), [(2, 0), (1, 2), (1, 1)])))
+    players = list(models.Player.without_freewin())
+
+    with django_assert_num_queries(1):
+        performances = models.standing(models.Duel.without_freewins(), players)
+
+    stats = {stats.player_id: stats.record for stats in models.PlayerStats.all_time()}
+    assert performances == models.sort_standing(performances)
+    assert len(performances) == len(players)
+    for performance in performances:
+        record = (performance.match_wins, performance.match_losses, performance.wins, performance.losses)
+        assert record == stats[performance.player.pk]
+
+
+@pytest.mark.django_db
+def test_rounds_take_the_same_queries_for_any_player_count():
+    query_counts = []
+    for player_count in (7, 63):
+        tournament = start_tournament(f"Tables {player_count}", player_count)
+        first_round = tournament.current_round
+        models.Duel.set_results(dict.fromkeys(first_round.duels.filter(is_bye=False), (2, 1)))
+        results_version = models.DataVersion.get(models.DataVersion.RESULTS)
+
+        with CaptureQueriesContext(connection) as queries:
+            next_round = tournament.start_next_round()
+        query_counts.append(len(queries))
+
+        pairings = [{duel.player_1_id, duel.player_2_id} for duel in next_round.duels.all()]
+        assert len(pairings) == (player_count + 1) // 2
+        assert not any(pairing in pairings for pairing in
+                       ({duel.player_1_id, duel.player_2_id} for duel in first_round.duels.all()))
+        assert models.DataVersion.get(models.DataVersion.RESULTS) > results_version
+        assert list(models.PlayerStats.verify()) == []
+
+    assert query_counts[0] == query_counts[1]
+
+
+@pytest.mark.django_db
+def test_byes_are_flagged_and_left_out_of_all_time_records():
+    tournament = start_tournament("Byes", 3)
+    bye = models.Player.bye()
+    assert bye.is_bye
+    assert bye in tournament.players.all()
+
+    duel = tournament.current_round.duels.get(is_bye=True)
+    assert duel.player_2 == bye and duel.player_1_wins > duel.player_2_wins
+    assert not models.Duel.without_freewins().filter(pk=duel.pk).exists()
+    assert not models.Player.without_freewin().filter(pk=bye.pk).exists()
+    assert duel.player_1.stats.get(tournament=tournament).record[0] == 1
+    assert not duel.player_1.stats.filter(tournament=None).exists()
+
+    start_tournament("More byes", 5)
+    assert models.Player.objects.filter(is_bye=True).count() == 1
+
+
+@pytest.mark.django_db
+def test_first_round_ranks_players_that_joined_after_the_ranking():
+    players = [models.Player.objects.create(name=f"Player {index}") for index in range(4)]
+    models.Tournament.objects.create(name="Ranked", teams={}).players.add(*players[:2])
+    models.RankingSnapshot.current()
+    players[3].delete()  # no duels, so only the new player tells the ranking apart from the old one
+    newcomer = models.Player.objects.create(name="Newcomer")
+
+    tournament = models.Tournament.objects.create(name="Newcomers", teams={})
+    tournament.players.add(*players[:3], newcomer)
+
+    assert newcomer in models.RankingSnapshot.current()
+    assert {player for duel in tournament.current_round.duels.all() for player in duel.players} == {
+        *players[:3], newcomer}
+
+
+@pytest.mark.django_db
+def test_player_profile_replaces_its_stale_cache_entry():
+    cache.clear()
+    tournament = start_tournament("Profile", 4)
+    duel = tournament.current_round.duels.first()
+    player = duel.player_1
+    assert player.profile().performance.match_wins == 0
+
+    models.Duel.set_results({duel: (2, 0)})
+
+    assert player.profile().performance.match_wins == 1
+    version, profile = cache.get(f"player-profile:{models.DataVersion.player(player.pk)}")
+    assert version == models.DataVersion.get(models.DataVersion.player(player.pk))
+    assert profile.performance.match_wins == 1
+
+
+@pytest.mark.django_db
+def test_all_time_standing_is_cached_until_results_change(monkeypatch, django_assert_num_queries):
+    cache.clear()
+    tournament = start_tournament("All-time", 4)
+    calculations = []
+    all_time_standing = models.Player.all_time_standing
+    monkeypatch.setattr(models.Player, "all_time_standing", classmethod(
+        lambda cls, *args, **kwargs: calculations.append(args) or all_time_standing(*args, **kwargs)))
+
+    models.Player.cached_all_time()
+    with django_assert_num_queries(1):  # the results version
+        models.Player.cached_all_time()
+    assert len(calculations) == 1
+
+    models.Duel.set_results({tournament.current_round.duels.first(): (2, 0)})
+    all_time = models.Player.cached_all_time()
+
+    assert len(calculations) == 2
+    assert [performance.match_wins for performance in all_time["standing"]] == [1, 0]  # only who played
+
+
+@pytest.mark.django_db
+def test_next_round_job_pairs_a_round_once():
+    players = [models.Player.objects.create(name=f"Player {index}") for index in range(8)]
+    tournament = models.Tournament.objects.create(name="Jobs", teams={})
+    tournament.players.add(*players)
+
+    job = models.Job.next_round(tournament, 2)
+    assert models.Job.next_round(tournament, 2) == job
+    assert models.Job.claim(datetime.timedelta(minutes=10)) == job
+    assert models.Job.claim(datetime.timedelta(minutes=10)) is None
+
+    job.run()
+    job.run()  # like a job that was queued again after its worker was lost
+
+    assert job.state == models.Job.DONE
+    assert sorted(tournament.rounds.values_list("number", flat=True)) == [1, 2]
+
+
+@pytest.mark.django_db
+def test_ranking_graph_is_drawn_by_a_job():
+    tournament = start_tournament("Graph", 4)
+    models.Duel.set_results({tournament.current_round.duels.first(): (2, 0)})
+
+    assert models.RankingGraph.current() is None
+    assert models.RankingGraph.current() is None
+    job = models.Job.claim(datetime.timedelta(minutes=10))
+    assert job.kind == models.Job.RANKING_GRAPH
+    assert models.Job.claim(datetime.timedelta(minutes=10)) is None
+
+    job.run()
+
+    assert job.state == models.Job.DONE
+    assert models.RankingGraph.current() is not None
+    assert not models.Job.pending().exists()
+
+
+@pytest.mark.django_db
+def test_tournament_events_replay_what_the_browser_missed(client, settings):
+    settings.EVENT_STREAM_SECONDS = 0  # only the replay
+    players = [models.Player.objects.create(name=f"Player {index}") for index in range(4)]
+    tournament = models.Tournament.objects.create(name="Events", teams={})
+    tournament.players.add(*players)
+    duel = tournament.current_round.duels.first()
+    models.Duel.set_results({duel: (2, 1)})
+    client.force_login(User.objects.create_user("events", first_name="Events"))
+
+    response = client.get(reverse("tournament_events", args=[tournament.pk]), HTTP_LAST_EVENT_ID="0")
+    stream = "".join(chunk.decode() for chunk in response.streaming_content)
+
+    assert response["Content-Type"] == "text/event-stream"
+    assert re.findall(r"^event: (\w+)$", stream, re.MULTILINE) == ["round", "standing", "results", "standing"]
+    assert f'data: {{"duels":[[{duel.pk},2,1]]}}' in stream
+
+
+@pytest.mark.django_db
+def test_round_event_has_the_duel_ids_when_the_database_returns_none(monkeypatch):
+    monkeypatch.setattr(connection.features, "can_return_ids_from_bulk_insert", False)  # like sqlite and mysql
+    tournament = start_tournament("Ids", 6)
+
+    event = tournament.events.filter(kind=models.TournamentEvent.ROUND).last()
+
+    assert sorted(duel[0] for duel in event.data["duels"]) == sorted(
+        tournament.current_round.duels.values_list("pk", flat=True))
+
+
+@pytest.mark.django_db
+def test_live_page_gets_the_events_since_it_was_rendered(client, settings):
+    settings.EVENT_STREAM_SECONDS = 0
+    tournament = start_tournament("Rendered", 4)
+    client.force_login(User.objects.create_user("rendered", first_name="Rendered"))
+    events_url = re.search(r'data-events="([^"]+)"', client.get(tournament.get_absolute_url()).content.decode())[1]
+
+    models.Duel.set_results({tournament.current_round.duels.first(): (2, 0)})  # before the browser connects
+    stream = "".join(chunk.decode() for chunk in client.get(events_url).streaming_content)
+
+    assert re.findall(r"^event: (\w+)$", stream, re.MULTILINE) == ["results", "standing"]
+
+
+@pytest.mark.django_db
+def test_api_pages_through_all_tournaments(client):
+    tournaments = [models.Tournament.objects.create(name=f"Api {index}", teams={},
+                                                    date=datetime.date(2019, 1, 1 + index % 3)) for index in range(7)]
+    client.force_login(User.objects.create_user("api", first_name="Api"))
+
+    seen, url = [], reverse("api_tournaments") + "?limit=3"
+    while url:
+        page = client.get(url).json()
+        assert len(page["results"]) <= 3
+        seen += [tournament["id"] for tournament in page["results"]]
+        url = page["next"]
+
+    assert seen == [tournament.pk for tournament in sorted(tournaments, key=lambda t: (t.date, t.pk), reverse=True)]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name, values", [("api_tournaments", 5), ("api_tournaments", ["nope", 1]),
+                                          ("api_tournaments", ["2019-01-01"]), ("api_ranking", [0.5, 1])])
+def test_api_rejects_cursors_of_another_shape(client, name, values):
+    client.force_login(User.objects.create_user("cursor", first_name="Cursor"))
+
+    response = client.get(reverse(name), {"after": api.encode_cursor(values)})
+
+    assert response.status_code == 400
+    assert "Invalid cursor" in response.json()["error"]
+
+
+@pytest.mark.django_db
+def test_api_pages_through_the_ranking(client):
+    tournament = start_tournament("Ranking", 8)
+    models.Duel.set_results({duel: (2, 1) for duel in tournament.current_round.duels.all()})
+    client.force_login(User.objects.create_user("ranking", first_name="Ranking"))
+
+    seen, url = [], reverse("api_ranking") + "?limit=3"
+    while url:
+        page = client.get(url).json()
+        seen += [row["player"] for row in page["results"]]
+        url = page["next"]
+
+    scores = {player.pk: score for player, score in models.RankingSnapshot.current().items()}
+    played = models.PlayerStats.all_time().values_list("player", flat=True)
+    assert seen == sorted(played, key=lambda name: (-scores[name], name))
+
+
+@pytest.mark.django_db
+def test_api_standing_leaves_out_deleted_duels(client):
+    tournament = start_tournament("Deleted", 4)
+    duel = tournament.current_round.duels.first()
+    models.Duel.set_results({duel: (2, 0)})
+    client.force_login(User.objects.create_user("deleted", first_name="Deleted"))
+
+    duel.delete()
+    standing = client.get(reverse("api_tournament", args=[tournament.pk])).json()["standing"]
+
+    assert [row["match_wins"] for row in standing] == [0] * 4
+
+
+@pytest.mark.django_db
+def test_imported_history_matches_live_standings():
+    rows = ["tournament,date,round,player_1,player_2,player_1_wins,player_2_wins"]
+    for number in range(1, 4):
+        rows += [f"Old,2018-05-04,{number},player {number},player {number + 1},2,1",
+                 f"Old,2018-05-04,{number},FREE WIN,player {number + 2},0,2"]
+    tournaments = history.read_csv(rows)
+
+    imported = history.import_history(tournaments)
+    assert (imported.tournaments, imported.rounds, imported.duels) == (1, 3, 6)
+    assert history.import_history(tournaments).skipped == tournaments
+
+    tournament = models.Tournament.objects.get(name="Old")
+    assert tournament.finished
+    assert tournament.players.count() == 6  # with FREE WIN, which no signal added
+    assert tournament.duels(models.Player.bye()).filter(player_1="Player 3").exists()
+    assert list(models.PlayerStats.verify()) == []
+
+
+@pytest.mark.django_db
+def test_results_of_an_already_paired_round_are_not_saved(client):
+    tournament = start_tournament("Stale", 8)
+    client.force_login(User.objects.create_user("stale", first_name="Stale"))
+    data = round_data(tournament.current_round)
+    assert client.post(tournament.get_absolute_url(), data).status_code == 302
+    models.Job.claim(datetime.timedelta(minutes=10)).run()
+
+    response = client.post(tournament.get_absolute_url(), data, follow=True)  # like the back button
+    assert "the results were not saved" in response.content.decode()
+    assert not tournament.current_round.duels.filter(is_bye=False, player_1_wins__gt=0).exists()
+
+    data = round_data(tournament.current_round, wins=("", ""))
+    response = client.post(tournament.get_absolute_url(), data)
+    assert response.status_code == 200
+    assert "Enter the wins of both players." in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_results_are_counted_from_the_saved_duels():
+    tournament = start_tournament("Counted", 4)
+    duel = tournament.current_round.duels.first()
+    other_submission = models.Duel.objects.get(pk=duel.pk)
+
+    models.Duel.set_results({duel: (2, 0)})
+    models.Duel.set_results({other_submission: (2, 1)})  # loaded before the first one was saved
+    other_submission.player_1_wins = 0
+    other_submission.save()
+
+    assert list(models.PlayerStats.verify()) == []
@@ -1,15 +1,24 @@
 from django.urls import path, include
 
+from . import api
 from . import views
 
 urlpatterns = [
     path('', views.ListTournaments.as_view(), name='tournament_list'),
     path('start', views.CreateTournament.as_view(), name='create_tournament'),
     path('players/', views.ListPlayers.as_view(), name='player_list'),
+    path('players/graph/<str:pk>.png', views.ShowRankingGraph.as_view(), name='ranking_graph'),
     path('players/autocomplete', views.PlayerAutocomplete.as_view(create_field='name'), name="player-autocomplete"),
     path('players/<str:pk>', views.ShowPlayer.as_view(), name='player_detail'),
+    path('metrics', views.ShowMetrics.as_view(), name='metrics'),
     path('<int:pk>', views.ShowTournament.as_view(), name='tournament_detail'),
+    path('<int:pk>/events', views.StreamTournamentEvents.as_view(), name='tournament_events'),
     path('<int:pk>/teams', views.CreateTeams.as_view(), name='create_teams'),
+    path('api/tournaments', api.ListTournaments.as_view(), name='api_tournaments'),
+    path('api/tournaments/<int:pk>', api.ShowTournament.as_view(), name='api_tournament'),
+    path('api/players/<str:pk>', api.ShowPlayer.as_view(), name='api_player'),
+    path('api/ranking', api.Ranking.as_view(), name='api_ranking'),
+    path('api/duels.ndjson', api.ExportDuels.as_view(), name='api_duels'),
     path('accounts/', include("mtg_pairings.accounts.urls"))
 ]
 
@@ -1,18 +1,71 @@
+import functools
+import hashlib
+import typing
+
 from dal import autocomplete
+from django.conf import settings
 from django.contrib import messages
-from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin
+from django.db.models import Prefetch
 from django.db.transaction import atomic
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
 from django.views import generic
+from django.views.decorators.http import condition
 
 from sentry_sdk import configure_scope
 
+from . import events
 from . import forms
+from . import metrics
 from . import models
 
 
 # Create your views here.
 
+def conditional(versions: typing.Callable[..., typing.Iterable[str]]):
+    """
+    Class decorator that answers conditional GETs with 304 Not Modified before the view does any work.
+
+    The ETag and Last-Modified come from the DataVersions named by versions(**kwargs), the user and the release.
+    The ETag also covers the session and the CSRF token, which forms on the pages are rendered with and which change
+    when a user logs in again. Unless the view sets a Cache-Control of its own, browsers revalidate every time.
+    """
+    def stamp(request, **kwargs):
+        if messages.get_messages(request):
+            return None  # the page shows pending messages, a 304 wouldn't
+        if not hasattr(request, "data_versions"):
+            request.data_versions = models.DataVersion.stamp(*versions(**kwargs))
+        return request.data_versions
+
+    def etag(request, *_, **kwargs):
+        versions_stamp = stamp(request, **kwargs)
+        if versions_stamp is not None:
+            get_token(request)  # a first visit gets its token now instead of while rendering
+            return hashlib.sha1(repr((
+                settings.RELEASE, request.user.pk, request.session.session_key, request.META["CSRF_COOKIE"],
+                request.get_full_path(), versions_stamp[0]
+            )).encode()).hexdigest()
+
+    def last_modified(request, *_, **kwargs):
+        versions_stamp = stamp(request, **kwargs)
+        return versions_stamp and versions_stamp[1]
+
+    def revalidate(get):
+        @functools.wraps(get)
+        def revalidated_get(request, *args, **kwargs):
+            response = get(request, *args, **kwargs)
+            if response.status_code == 200 and not response.has_header("Cache-Control"):
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return revalidated_get
+
+    return method_decorator([revalidate, condition(etag_func=etag, last_modified_func=last_modified)], name="get")
+
+
+@conditional(lambda **_: [models.DataVersion.TOURNAMENTS])
 class ListTournaments(LoginRequiredMixin, generic.ListView):
     model = models.Tournament
     template_name = 'tournament_list.html'
@@ -31,18 +84,27 @@ class CreateTournament(PermissionRequiredMixin, generic.CreateView):
     form_class = forms.TournamentForm
 
 
+@conditional(lambda pk: [models.DataVersion.tournament(pk)])
 class ShowTournament(LoginRequiredMixin, generic.DetailView):
     model = models.Tournament
+    queryset = model.with_rounds()
     template_name = 'view_tournament.html'
     fields = ('name', 'player', 'rounds')
+    FINISHED_MAX_AGE = 7 * 24 * 60 * 60
 
     object: models.Tournament
 
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        if self.object.finished:  # nothing changes anymore
+            patch_cache_control(response, private=True, max_age=self.FINISHED_MAX_AGE)
+        return response
+
     def get_context_data(self, **kwargs):
         with configure_scope() as scope:
             scope.user = self.request.user
             context = super(ShowTournament, self).get_context_data(**kwargs)
-            current_round = self.object.current_round
+            current_round = list(self.object.rounds.all())[-1]  # prefetched and ordered by number
             context.setdefault('round_form', forms.RoundForm(round=current_round))
             context['current_round'] = current_round.number
             return context
@@ -55,32 +117,50 @@ class ShowTournament(LoginRequiredMixin, generic.DetailView):
                 "email": self.request.user.email,
             }
 
-            self.object = self.get_object()
-            form = forms.RoundForm(request.POST, round=self.object.current_round)
+            # submissions of the tournament and pairing its rounds wait for each other
+            self.object = self.get_object(self.model.objects.select_for_update())
+            current_round = self.object.rounds.prefetch_related(
+                Prefetch("duels", queryset=models.Duel.objects.select_related("player_1", "player_2"))
+            ).latest("number")
+            if not forms.RoundForm.is_for(request.POST, current_round):
+                messages.warning(request, f"Round {current_round.number} has been paired in the meantime, "
+                                          "the results were not saved.")
+                return HttpResponseRedirect(self.object.get_absolute_url())
+
+            form = forms.RoundForm(request.POST, round=current_round)
             if form.is_valid():
-                for player_1_performance, player_2_performance in form.results():
-                    current_round = self.object.current_round
-                    duel = current_round.get_duel_for_players(player_1_performance.player,
-                                                              player_2_performance.player)
-                    duel.set_player_performance(player_1_performance)
-                    duel.set_player_performance(player_2_performance)
-                try:
-                    self.object.start_next_round()
-                except AssertionError as error:
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.error('Error when pairing', exc_info=error)
-                    messages.warning(request, "Couldn't pair all players for next round. Finished this tournament.")
-                    self.object.finish()
-                    return HttpResponseRedirect('#finished')
-
-                return HttpResponseRedirect('#worked')
+                models.Duel.set_results(form.results())
+                # the run_jobs worker pairs the next round, the page shows that until it's done
+                models.Job.next_round(self.object, current_round.number + 1)
+                return HttpResponseRedirect('#pairing')
 
+            self.object = self.get_object()
             return self.render_to_response(
                 context=self.get_context_data(round_form=form)
             )
 
 
+class StreamTournamentEvents(LoginRequiredMixin, generic.detail.SingleObjectMixin, generic.View):
+    """The live changes of a tournament as Server-Sent Events, see mtg_pairings.events."""
+    model = models.Tournament
+
+    def get(self, request, *args, **kwargs):
+        tournament = self.get_object()
+        if tournament.finished:
+            return HttpResponse(status=204)  # nothing changes anymore, 204 stops the browser from reconnecting
+
+        # browsers send the id of the last event they got when they reconnect, the page the one it was rendered at
+        try:
+            last_event_id = int(request.META.get("HTTP_LAST_EVENT_ID") or request.GET["after"])
+        except (KeyError, ValueError):
+            last_event_id = None
+
+        response = StreamingHttpResponse(events.stream(tournament.pk, last_event_id), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # proxies should pass every event on right away
+        return response
+
+
 class CreateTeams(LoginRequiredMixin, generic.UpdateView):
     model = models.Tournament
     template_name = "team_form.html"
@@ -93,45 +173,70 @@ class CreateTeams(LoginRequiredMixin, generic.UpdateView):
         return HttpResponseRedirect(self.object.get_absolute_url())
 
 
+@conditional(lambda **_: [models.DataVersion.RESULTS, models.DataVersion.RANKING_GRAPH])
 class ListPlayers(LoginRequiredMixin, generic.ListView):
     model = models.Player
     template_name = 'player_list.html'
 
     def get_queryset(self):
-        return self.model.all_time_standing()
+        self.all_time = self.model.cached_all_time()
+        return self.all_time["standing"]
 
     def get_context_data(self, *, object_list=None, **kwargs):
         draw = self.request.GET.get("draw", "false").lower() == "true"
         context = super(ListPlayers, self).get_context_data()
-        all_time_ranking = self.model.all_time_ranking(draw=draw)
+        graph = models.RankingGraph.current() if draw else None
+        context.setdefault(
+            "pageranking", self.all_time["ranking"]
+        )
         context.setdefault(
-            "pageranking", all_time_ranking["ranking"]
+            "graph", graph
         )
         context.setdefault(
-            "graph", all_time_ranking["graph"].decode("utf8")
+            "graph_pending", draw and graph is None
         )
         return context
 
 
+class ShowRankingGraph(LoginRequiredMixin, generic.DetailView):
+    model = models.RankingGraph
+
+    def render_to_response(self, context, **response_kwargs):
+        response = HttpResponse(self.object.image, content_type="image/png")
+        # the URL contains the hash of the image, so it never changes.
+        patch_cache_control(response, private=True, max_age=365 * 24 * 60 * 60, immutable=True)
+        response["ETag"] = f'"{self.object.digest}"'
+        return response
+
+
+@conditional(lambda pk: [models.DataVersion.player(pk), models.DataVersion.TOURNAMENTS])
 class ShowPlayer(LoginRequiredMixin, generic.DetailView):
     model = models.Player
     template_name = 'player_detail.html'
 
     def get_context_data(self, **kwargs):
         context = super(ShowPlayer, self).get_context_data(**kwargs)
-        context.setdefault(
-            "tournaments", {
-                tournament: [
-                    {"opponent": duel.opponent(self.object), "wins": duel.wins_of(self.object),
-                     "losses": duel.losses_of(self.object)}
-                    for duel in tournament.duels(self.object)
-                ]
-                for tournament in self.object.tournaments.all()
-            }
-        )
+        profile = self.object.profile()
+        context.setdefault("performance", profile.performance)
+        context.setdefault("head_to_head", profile.head_to_head)
+        context.setdefault("tournaments", profile.tournaments)
         return context
 
 
+class ShowMetrics(UserPassesTestMixin, generic.View):
+    """The metrics histograms for Prometheus, only for staff."""
+    raise_exception = True
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        if not settings.METRICS_ENABLED:
+            raise Http404("Metrics are turned off.")
+
+        return HttpResponse(metrics.exposition(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 class PlayerAutocomplete(autocomplete.Select2QuerySetView):
     def get_queryset(self):
         if not self.request.user.is_authenticated: